@@ -0,0 +1,102 @@
+import math
+import time
+
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import BulkWriteError
+
+DAY = 86400
+# prices below this share the lowest bucket
+MIN_PRICE = 1e-6
+
+
+class Sketch:
+    # log-bucketed quantile sketch, every quantile is within relative_accuracy of a real sale price
+    def __init__(self, relative_accuracy=0.01):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+
+    def index(self, value):
+        return math.ceil(math.log(max(value, MIN_PRICE)) / self.log_gamma)
+
+    def value(self, index):
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def quantile(self, counts, q):
+        total = sum(counts.values())
+        if total == 0:
+            return None
+        rank = q * (total - 1)
+        seen = 0
+        for index in sorted(counts):
+            seen += counts[index]
+            if seen > rank:
+                return self.value(index)
+        return self.value(max(counts))
+
+
+class SoldStats:
+    def __init__(self, collection, level_band=10, relative_accuracy=0.01):
+        self.collection = collection
+        self.level_band = level_band
+        self.sketch = Sketch(relative_accuracy)
+        self.collection.create_index([('kind', ASCENDING), ('key', ASCENDING), ('day', ASCENDING)], unique=True)
+        self.collection.create_index('day')
+
+    def bucket(self, kind, d):
+        if kind == 'character':
+            level = d['character_level'] // self.level_band * self.level_band
+            return {'trait': d['character_trait'], 'level': level}, f'{d["character_trait"]}:{level}'
+        return {'trait': d[f'{kind}_trait'], 'stars': d[f'{kind}_stars']}, f'{d[f"{kind}_trait"]}:{d[f"{kind}_stars"]}'
+
+    def updates(self, block, sales, timestamp=None):
+        # one document per bucket and day, a block's sales of a bucket go in as one increment;
+        # last_block makes the increment a no-op when the block is replayed
+        day = int(timestamp or time.time()) // DAY * DAY
+        buckets = {}
+        for kind, d in sales:
+            fields, key = self.bucket(kind, d)
+            price = float(d[f'{kind}_price'])
+            bucket = buckets.setdefault((kind, key), {'fields': fields, 'count': 0, 'volume': 0.0,
+                                                      'min': price, 'max': price, 'sketch': {}})
+            bucket['count'] += 1
+            bucket['volume'] += price
+            bucket['min'] = min(bucket['min'], price)
+            bucket['max'] = max(bucket['max'], price)
+            index = self.sketch.index(price)
+            bucket['sketch'][index] = bucket['sketch'].get(index, 0) + 1
+        return [UpdateOne({'kind': kind, 'key': key, 'day': day, 'last_block': {'$not': {'$gte': block}}},
+                          {'$setOnInsert': bucket['fields'],
+                           '$set': {'last_block': block},
+                           '$inc': {'count': bucket['count'], 'volume': bucket['volume'],
+                                    **{f'sketch.{index}': count for index, count in bucket['sketch'].items()}},
+                           '$min': {'min': bucket['min']},
+                           '$max': {'max': bucket['max']}}, upsert=True)
+                for (kind, key), bucket in buckets.items()]
+
+    def write(self, operations):
+        # a bucket that already counted the block turns its upsert into an insert that hits the unique index
+        try:
+            self.collection.bulk_write(operations, ordered=False)
+        except BulkWriteError as err:
+            if any(error['code'] != 11000 for error in err.details['writeErrors']):
+                raise
+
+    def summaries(self, kind, days=7, quantiles=(0.1, 0.5, 0.9), now=None):
+        # rolling window of the last days, O(buckets * days) documents
+        since = (int(now or time.time()) // DAY - days + 1) * DAY
+        merged = {}
+        for document in self.collection.find({'kind': kind, 'day': {'$gte': since}}):
+            summary = merged.setdefault(document['key'], {
+                **{field: document[field] for field in ['trait', 'level', 'stars'] if field in document},
+                'count': 0, 'volume': 0.0, 'min': document['min'], 'max': document['max'], 'sketch': {}})
+            summary['count'] += document['count']
+            summary['volume'] += document['volume']
+            summary['min'] = min(summary['min'], document['min'])
+            summary['max'] = max(summary['max'], document['max'])
+            for index, count in document['sketch'].items():
+                summary['sketch'][int(index)] = summary['sketch'].get(int(index), 0) + count
+        for summary in merged.values():
+            sketch = summary.pop('sketch')
+            for q in quantiles:
+                summary[f'p{round(q * 100)}'] = self.sketch.quantile(sketch, q)
+        return merged
@@ -0,0 +1,148 @@
+import os
+import sys
+
+import numpy as np
+
+EVENTS = ['cb_quest_complete', 'cb_quest_skipped', 'cb_quest_assigned', 'cb_quest_weekly_reward_claimed',
+          'cb_pvp_duel_finished', 'cb_character_minted', 'cb_character_burned', 'cb_weapon_minted',
+          'cb_weapon_burned', 'cb_shield_minted', 'cb_shield_burned']
+EVENT_CODES = {event: code for code, event in enumerate(EVENTS)}
+# one fixed width file per column and segment, a missing field is stored as 0
+COLUMNS = {
+    'block': np.dtype('<u8'),
+    'log_index': np.dtype('<u4'),
+    'event': np.dtype('u1'),
+    # character, weapon or shield, the attacker of a duel
+    'id': np.dtype('<u8'),
+    # quest of a quest event, the defender of a duel
+    'ref': np.dtype('<u8'),
+    'tier': np.dtype('<u2'),
+    'stars': np.dtype('u1'),
+    'weapon_type': np.dtype('<u4'),
+    'level': np.dtype('<u2'),
+    'attacker_roll': np.dtype('<u8'),
+    'defender_roll': np.dtype('<u8'),
+    'attacker_won': np.dtype('u1'),
+    'bonus_rank': np.dtype('<u8'),
+    'user': np.dtype('S20'),
+    'hash': np.dtype('S32'),
+}
+# event label -> column
+FIELDS = {'character': 'id', 'weapon': 'id', 'shield': 'id', 'attacker': 'id', 'quest': 'ref', 'defender': 'ref',
+          'tier': 'tier', 'weapon_stars': 'stars', 'shield_stars': 'stars', 'weapon_type': 'weapon_type',
+          'character_level': 'level', 'attacker_roll': 'attacker_roll', 'defender_roll': 'defender_roll',
+          'attacker_won': 'attacker_won', 'bonus_rank': 'bonus_rank', 'user': 'user', 'hash': 'hash'}
+
+
+def to_bytes(value):
+    value = value.hex() if isinstance(value, bytes) else value
+    return bytes.fromhex(value[2:] if value.startswith('0x') else value)
+
+
+def to_hex(value):
+    return '0x' + bytes(value).hex()
+
+
+class EventArchive:
+    # append only, root/network/<first block of the segment>/<column>.bin, rows ordered by (block, log_index)
+    def __init__(self, root, network, segment_blocks=1000000):
+        self.path = os.path.join(root, network)
+        self.segment_blocks = segment_blocks
+        os.makedirs(self.path, exist_ok=True)
+        self.last = self.recover()
+
+    def segments(self, from_block=0, to_block=None):
+        for name in sorted(os.listdir(self.path)):
+            start = int(name)
+            if start + self.segment_blocks <= from_block or (to_block is not None and start > to_block):
+                continue
+            yield os.path.join(self.path, name)
+
+    def length(self, segment, column):
+        path = os.path.join(segment, f'{column}.bin')
+        return os.path.getsize(path) // COLUMNS[column].itemsize if os.path.exists(path) else 0
+
+    def recover(self):
+        # a crash between two column writes leaves the segment ragged, cut it back to its complete rows
+        for segment in reversed(list(self.segments())):
+            rows = min(self.length(segment, column) for column in COLUMNS)
+            for column, dtype in COLUMNS.items():
+                with open(os.path.join(segment, f'{column}.bin'), 'ab') as f:
+                    f.truncate(rows * dtype.itemsize)
+            if rows:
+                block = np.memmap(os.path.join(segment, 'block.bin'), COLUMNS['block'], mode='r', shape=(rows,))
+                log_index = np.memmap(os.path.join(segment, 'log_index.bin'), COLUMNS['log_index'], mode='r',
+                                      shape=(rows,))
+                return int(block[-1]), int(log_index[-1])
+        return -1, -1
+
+    def append(self, rows):
+        # blocks replayed after a restart are already on disk
+        rows = [row for row in rows if (row['block'], row['log_index']) > self.last]
+        if not rows:
+            return
+        rows.sort(key=lambda row: (row['block'], row['log_index']))
+        segments = {}
+        for row in rows:
+            segments.setdefault(row['block'] // self.segment_blocks * self.segment_blocks, []).append(row)
+        for start, segment_rows in segments.items():
+            segment = os.path.join(self.path, f'{start:012d}')
+            os.makedirs(segment, exist_ok=True)
+            columns = {column: [] for column in COLUMNS}
+            for row in segment_rows:
+                values = {'block': row['block'], 'log_index': row['log_index'], 'event': EVENT_CODES[row['event']]}
+                for field, value in row.items():
+                    if field in FIELDS:
+                        values[FIELDS[field]] = to_bytes(value) if FIELDS[field] in ('user', 'hash') else int(value)
+                for column, dtype in COLUMNS.items():
+                    columns[column].append(values.get(column, b'' if dtype.kind == 'S' else 0))
+            for column, dtype in COLUMNS.items():
+                with open(os.path.join(segment, f'{column}.bin'), 'ab') as f:
+                    f.write(np.array(columns[column], dtype=dtype).tobytes())
+        self.last = rows[-1]['block'], rows[-1]['log_index']
+
+    def scan(self, from_block=0, to_block=None, event=None, id=None, columns=None, chunk=1000000):
+        # yields dicts of column arrays, at most chunk rows of a segment are in memory at once
+        columns = list(columns or COLUMNS)
+        code = EVENT_CODES[event] if event is not None else None
+        for segment in self.segments(from_block, to_block):
+            rows = min(self.length(segment, column) for column in COLUMNS)
+            if rows == 0:
+                continue
+            data = {column: np.memmap(os.path.join(segment, f'{column}.bin'), COLUMNS[column], mode='r', shape=(rows,))
+                    for column in set(columns) | {'block', 'event', 'id'}}
+            low = np.searchsorted(data['block'], from_block, side='left')
+            high = np.searchsorted(data['block'], to_block, side='right') if to_block is not None else rows
+            for begin in range(low, high, chunk):
+                end = min(begin + chunk, high)
+                mask = np.ones(end - begin, dtype=bool)
+                if code is not None:
+                    mask &= data['event'][begin:end] == code
+                if id is not None:
+                    mask &= data['id'][begin:end] == id
+                if mask.any():
+                    yield {column: np.array(data[column][begin:end][mask]) for column in columns}
+
+    def records(self, *args, **kwargs):
+        # row dicts for ad hoc queries, scan is the fast path
+        for chunk in self.scan(*args, **kwargs):
+            for i in range(len(next(iter(chunk.values())))):
+                record = {}
+                for column, values in chunk.items():
+                    if column == 'event':
+                        record[column] = EVENTS[values[i]]
+                    elif COLUMNS[column].kind == 'S':
+                        record[column] = to_hex(values[i].ljust(COLUMNS[column].itemsize, b'\0'))
+                    else:
+                        record[column] = int(values[i])
+                yield record
+
+
+if __name__ == '__main__':
+    # python archive.py root network event [id] [from_block] [to_block]
+    archive = EventArchive(sys.argv[1], sys.argv[2])
+    id = int(sys.argv[4]) if len(sys.argv) > 4 else None
+    from_block = int(sys.argv[5]) if len(sys.argv) > 5 else 0
+    to_block = int(sys.argv[6]) if len(sys.argv) > 6 else None
+    for record in archive.records(from_block, to_block, sys.argv[3], id):
+        print(record)
@@ -0,0 +1,77 @@
+import os
+import sys
+import timeit
+
+from market import ADD_LISTING, CHANGE_LISTING_PRICE, PURCHASE_BURN_CHARACTER, PURCHASE_LISTING, Classifier
+
+# bsc contracts, used for the synthetic block
+CHARACTERS = '0xc6F252c2CdD4087e30608A35c022ce490B58179b'
+WEAPONS = '0x7E091b0a220356B157131c831258A9C98aC8031A'
+SHIELDS = '0xf9E9F6019631bBE7db1B71Ec4262778eb6C3c520'
+
+
+def word(value):
+    if isinstance(value, str):
+        return value[2:].lower().rjust(64, '0')
+    return hex(value)[2:].rjust(64, '0')
+
+
+def synthetic_block(size=300):
+    # mostly swaps and transfers with a few market calls, close to a busy bsc block
+    inputs = []
+    for i in range(size):
+        if i % 50 == 0:
+            inputs.append(ADD_LISTING + word(WEAPONS) + word(i) + word(10 ** 18) + word(0))
+        elif i % 50 == 1:
+            inputs.append(PURCHASE_LISTING + word(CHARACTERS) + word(i) + word(10 ** 18))
+        elif i % 50 == 2:
+            inputs.append(PURCHASE_BURN_CHARACTER + word(i) + word(10 ** 18))
+        elif i % 3 == 0:
+            inputs.append('0xa9059cbb' + word(WEAPONS) + word(i * 10 ** 15))
+        else:
+            inputs.append('0x38ed1739' + ''.join(word(i * j + 1) for j in range(8 + i % 24)))
+    return inputs
+
+
+def recorded_block(network, block):
+    from cryptoblades import Cryptoblades
+    cb = Cryptoblades(network=network)
+    return [txn['input'] for txn in cb.get_block_by_number(block)['transactions']]
+
+
+def substring_loop(inputs, addresses):
+    character_address, weapon_address, shield_address = addresses
+    found = 0
+    for txn_input in inputs:
+        for method in [ADD_LISTING, CHANGE_LISTING_PRICE, PURCHASE_LISTING, PURCHASE_BURN_CHARACTER]:
+            if method in txn_input and weapon_address in txn_input or \
+                    method in txn_input and shield_address in txn_input or \
+                    method in txn_input and character_address in txn_input:
+                found += 1
+    return found
+
+
+def classifier_loop(inputs, classifier):
+    found = 0
+    for txn_input in inputs:
+        if classifier.classify(txn_input) is not None:
+            found += 1
+    return found
+
+
+if __name__ == '__main__':
+    # python bench_market.py [network block], needs config.yaml for a recorded block
+    if len(sys.argv) == 3 and os.path.exists('config.yaml'):
+        block_inputs = recorded_block(sys.argv[1], int(sys.argv[2]))
+        print(f'{sys.argv[1]} block {sys.argv[2]}')
+    else:
+        block_inputs = synthetic_block()
+        print('synthetic block')
+    print(f'{len(block_inputs)} txns {sum(len(txn_input) for txn_input in block_inputs) // 2} bytes of input')
+    substring_addresses = [address.split('0x')[1].lower() for address in [CHARACTERS, WEAPONS, SHIELDS]]
+    market_classifier = Classifier(CHARACTERS, WEAPONS, SHIELDS)
+    number = 200
+    for name, func, arg in [('substring', substring_loop, substring_addresses),
+                            ('classifier', classifier_loop, market_classifier)]:
+        seconds = min(timeit.repeat(lambda: func(block_inputs, arg), number=number, repeat=5)) / number
+        print(f'{name:<10} {seconds * 1e6:9.1f} us/block {func(block_inputs, arg)} matches')
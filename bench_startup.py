@@ -0,0 +1,62 @@
+import json
+import time
+
+import yaml
+from web3 import Web3
+from web3.middleware import geth_poa_middleware
+
+from cryptoblades import Cryptoblades, load_abi, load_config
+
+NETWORKS = ['bsc', 'heco', 'oec', 'poly', 'avax', 'skale']
+CONTRACTS = ['cryptoblades', 'weapons', 'characters', 'shields', 'market', 'raid', 'skill', 'treasury', 'pvp', 'quests']
+# contracts the Metrics event handlers touch at startup
+METRICS_CONTRACTS = ['quests', 'pvp', 'characters', 'weapons', 'shields']
+
+
+class BaselineCryptoblades:
+    # Cryptoblades.__init__ as of the baseline commit: config and every ABI parsed and every contract
+    # built per instance, web3 with its default ENS setup; the per contract blocks are folded into a loop
+    def __init__(self, network):
+        with open('config.yaml') as f:
+            config = yaml.full_load(f)
+        self.config = config[network]
+        self.w3 = Web3(Web3.HTTPProvider(self.config['path_http']))
+        self.w3.middleware_onion.inject(geth_poa_middleware, layer=0)
+        for name in CONTRACTS + (['king'] if network == 'bsc' else []):
+            address = self.w3.toChecksumAddress(self.config[f'{name}_address'])
+            with open(config['abi'][name]) as f:
+                abi = json.loads(f.read())
+            setattr(self, f'{name}_contract', self.w3.eth.contract(address=address, abi=abi))
+        for name in ['bridge', 'deployer', 'tokens', 'raid_bot', 'bridge_bot', 'pvp_bot'] + \
+                (['king_tax'] if network == 'bsc' else []):
+            setattr(self, f'{name}_address', self.w3.toChecksumAddress(self.config[f'{name}_address']))
+
+
+def start_baseline():
+    # 6 networks x 2 services, the way one host starts metrics and discord
+    begin = time.perf_counter()
+    for _ in range(2):
+        for network in NETWORKS:
+            BaselineCryptoblades(network)
+    return time.perf_counter() - begin
+
+
+def start(contracts):
+    load_config.cache_clear()
+    load_abi.cache_clear()
+    begin = time.perf_counter()
+    for _ in range(2):
+        for network in NETWORKS:
+            cb = Cryptoblades(network=network)
+            for name in contracts:
+                getattr(cb, f'{name}_contract')
+    return time.perf_counter() - begin
+
+
+if __name__ == '__main__':
+    # needs config.yaml, no node connection is made
+    start_baseline()
+    baseline = min(start_baseline() for _ in range(5))
+    cached = min(start(METRICS_CONTRACTS) for _ in range(5))
+    print(f'baseline constructor       {baseline * 1000:8.1f} ms')
+    print(f'cached, lazy contracts     {cached * 1000:8.1f} ms')
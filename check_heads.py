@@ -0,0 +1,91 @@
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+
+from heads import Heads
+
+HEADS = [100, 101, 102]
+
+
+class StandInNode:
+    # unix socket node that acks eth_subscribe, sends a head whenever asked to and then hangs up
+    def __init__(self, path):
+        self.path = path
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(path)
+        self.server.listen(1)
+        self.send = threading.Event()
+        self.closed = threading.Event()
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def serve(self):
+        connection, _ = self.server.accept()
+        # no reconnect, the client has to fall back to polling
+        self.server.close()
+        os.unlink(self.path)
+        with connection:
+            request = json.loads(connection.recv(65536))
+            connection.sendall(json.dumps({'jsonrpc': '2.0', 'id': request['id'], 'result': '0x1'}).encode())
+            for number in HEADS:
+                self.send.wait()
+                self.send.clear()
+                connection.sendall(json.dumps({'jsonrpc': '2.0', 'method': 'eth_subscription',
+                                               'params': {'subscription': '0x1',
+                                                          'result': {'number': hex(number)}}}).encode())
+            self.send.wait()
+        self.closed.set()
+
+
+class StandInClient:
+    # the part of Cryptoblades that Heads uses
+    def __init__(self, path, head):
+        self.path = path
+        self.config = {}
+        self.head = head
+        self.polls = 0
+
+    def get_latest_block_number(self):
+        self.polls += 1
+        return self.head
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('timed out')
+        time.sleep(0.01)
+
+
+if __name__ == '__main__':
+    # no node needed, checks the newHeads wake ups and the fallback to polling
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'node.ipc')
+        node = StandInNode(path)
+        client = StandInClient(path, HEADS[-1] + 5)
+        heads = Heads('standin', client, max_interval=2)
+        wait_for(lambda: heads.subscribed)
+        for number in HEADS:
+            node.send.set()
+            begin = time.monotonic()
+            heads.wait()
+            elapsed = time.monotonic() - begin
+            assert elapsed < 1, f'woke up after {elapsed:.2f}s'
+            assert heads.latest() == number, heads.latest()
+            print(f'head {number} woke the loop after {elapsed * 1000:.1f} ms')
+        assert client.polls == 0, f'{client.polls} polls while subscribed'
+        node.send.set()
+        node.closed.wait(5)
+        wait_for(lambda: not heads.subscribed)
+        assert heads.latest() == client.head and client.polls == 1
+        # the polled head sets the event, the next wait is a polling interval
+        heads.wait()
+        begin = time.monotonic()
+        heads.wait()
+        elapsed = time.monotonic() - begin
+        assert heads.interval() - 0.1 <= elapsed <= heads.interval() + 0.5, f'polling wait took {elapsed:.2f}s'
+        print(f'disconnected, polled head {client.head}, next poll in {heads.interval():.2f}s')
+        print('ok')
@@ -0,0 +1,47 @@
+from aggregates import SoldStats
+
+DAY_START = 1700006400
+
+
+def sale(kind, trait, stars_or_level, price):
+    if kind == 'character':
+        return kind, {'character_trait': trait, 'character_level': stars_or_level, 'character_price': price}
+    return kind, {f'{kind}_trait': trait, f'{kind}_stars': stars_or_level, f'{kind}_price': price}
+
+
+def counts(collection):
+    return sorted((document['kind'], document['key'], document['count'], document['volume'], document['min'],
+                   document['max'], sorted(document['sketch'].items()), document['last_block'])
+                  for document in collection.find({}, {'_id': 0}))
+
+
+def check(collection):
+    # a block written again, as after a restart from an older cursor, must leave every bucket as it was
+    stats = SoldStats(collection)
+    block_100 = [sale('weapon', 1, 4, 10.0), sale('weapon', 1, 4, 12.0), sale('character', 2, 17, 3.0)]
+    block_101 = [sale('weapon', 1, 4, 20.0), sale('shield', 0, 2, 1.5)]
+    stats.write(stats.updates(100, block_100, DAY_START + 60))
+    after_100 = counts(collection)
+    stats.write(stats.updates(100, block_100, DAY_START + 60))
+    assert counts(collection) == after_100, 'block 100 counted twice'
+    stats.write(stats.updates(101, block_101, DAY_START + 63))
+    after_101 = counts(collection)
+    for block, sales, timestamp in [(100, block_100, DAY_START + 60), (101, block_101, DAY_START + 63)]:
+        stats.write(stats.updates(block, sales, timestamp))
+    assert counts(collection) == after_101, 'replayed blocks changed the counts'
+    summary = stats.summaries('weapon', now=DAY_START + 120)['1:4']
+    assert summary['count'] == 3 and summary['volume'] == 42.0, summary
+    assert summary['min'] == 10.0 and summary['max'] == 20.0, summary
+    print(f'replayed blocks left {len(after_101)} buckets unchanged, weapon 1:4 {summary}')
+
+
+if __name__ == '__main__':
+    # python check_sold_stats.py, needs the mongodb section of config.yaml, uses a scratch collection
+    from db import DB
+    collection = DB().client.cryptoblades.cb_check_sold_stats
+    collection.drop()
+    try:
+        check(collection)
+    finally:
+        collection.drop()
+    print('ok')
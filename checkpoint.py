@@ -0,0 +1,87 @@
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+
+
+class Checkpoint(ABC):
+    def __init__(self, every_blocks=100, every_seconds=10):
+        self.every_blocks = every_blocks
+        self.every_seconds = every_seconds
+        # next block to process, kept in memory and written out now and then
+        self.block = None
+        self.committed = None
+        self.committed_time = time.monotonic()
+        # commit is also called from the main thread on shutdown
+        self.lock = threading.Lock()
+
+    def load(self, default):
+        block = self.read()
+        if block is None:
+            block = default
+            self.write(block)
+        self.block = self.committed = block
+        self.committed_time = time.monotonic()
+        return block
+
+    def advance(self, block):
+        self.block = block
+
+    def due(self):
+        if self.block == self.committed:
+            return False
+        return self.block - self.committed >= self.every_blocks or \
+            time.monotonic() - self.committed_time >= self.every_seconds
+
+    def commit(self):
+        with self.lock:
+            block = self.block
+            if block is None or block == self.committed:
+                return
+            self.write(block)
+            self.committed = block
+            self.committed_time = time.monotonic()
+
+    @abstractmethod
+    def read(self):
+        pass
+
+    @abstractmethod
+    def write(self, block):
+        pass
+
+
+class FileCheckpoint(Checkpoint):
+    def __init__(self, path, every_blocks=100, every_seconds=10):
+        super().__init__(every_blocks, every_seconds)
+        self.path = path
+
+    def read(self):
+        try:
+            with open(self.path) as f:
+                return int(f.read())
+        except FileNotFoundError:
+            return None
+
+    def write(self, block):
+        # readers see either the old or the new file, never a partial one
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(str(block))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+
+class MongoCheckpoint(Checkpoint):
+    def __init__(self, collection, network, every_blocks=100, every_seconds=10):
+        super().__init__(every_blocks, every_seconds)
+        self.collection = collection
+        self.network = network
+
+    def read(self):
+        document = self.collection.find_one({'network': self.network})
+        return None if document is None else document['last_block']
+
+    def write(self, block):
+        self.collection.update_one({'network': self.network}, {'$set': {'last_block': block}}, upsert=True)
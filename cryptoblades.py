@@ -1,14 +1,40 @@
 import json
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import cached_property, lru_cache
 
 import yaml
+from multicall import Call, Multicall
 from web3 import Web3
+from web3.eth import AsyncEth
 from web3.middleware import geth_poa_middleware
 
+from provider import Batch, PooledHTTPProvider
+
+
+@lru_cache(maxsize=None)
+def load_config():
+    # parsed once per process, treat the result as read only
+    with open('config.yaml') as f:
+        return yaml.full_load(f)
+
+
+@lru_cache(maxsize=None)
+def load_abi(path):
+    with open(path) as f:
+        return json.loads(f.read())
+
+
+def mulu(x, y):
+    # ABDKMath64x64.mulu, multiplies 64.64 fixed point x by integer y
+    lo = (x * (y & 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF)) >> 64
+    hi = x * (y >> 128)
+    return (hi << 64) + lo
+
 
 class Cryptoblades:
-    def __init__(self, network, path=None, fallback=False):
-        with open('config.yaml') as f:
-            config = yaml.full_load(f)
+    def __init__(self, network, path=None, fallback=False, archive=False):
+        config = load_config()
         if network == 'bsc':
             self.config = config['bsc']
         elif network == 'heco':
@@ -25,63 +51,38 @@ class Cryptoblades:
             self.config = config['skale']
         else:
             raise TypeError(f'Wrong network {network}')
+        self.abi_paths = config['abi']
+        self.path = path
         if path is not None:
+            self.endpoint = None
             self.w3 = Web3(Web3.IPCProvider(path))
+        elif archive:
+            # historical state, pruned nodes only keep recent blocks
+            self.endpoint = self.config.get('path_archive', self.config['path_http'])
+            self.w3 = Web3(PooledHTTPProvider(self.endpoint, self.config.get('pool_size', 10)))
         elif not fallback:
-            self.w3 = Web3(Web3.HTTPProvider(self.config['path_http']))
+            self.endpoint = self.config['path_http']
+            self.w3 = Web3(PooledHTTPProvider(self.endpoint, self.config.get('pool_size', 10)))
         else:
-            self.w3 = Web3(Web3.HTTPProvider(self.config['path_http_fallback']))
+            self.endpoint = self.config['path_http_fallback']
+            self.w3 = Web3(PooledHTTPProvider(self.endpoint, self.config.get('pool_size', 10)))
+        self.batch_size = self.config.get('batch_size', 100)
         self.w3.middleware_onion.inject(geth_poa_middleware, layer=0)
-        # cryptoblades
+        # every address is a checksum address, otherwise web3 builds an ENS client per contract
+        self.w3.ens = None
+        # contracts are built on first use, see the *_contract properties
         self.cryptoblades_address = self.w3.toChecksumAddress(self.config['cryptoblades_address'])
-        with open(config['abi']['cryptoblades']) as f:
-            self.cryptoblades_abi = json.loads(f.read())
-        self.cryptoblades_contract = self.w3.eth.contract(address=self.cryptoblades_address, abi=self.cryptoblades_abi)
-        # weapons
         self.weapons_address = self.w3.toChecksumAddress(self.config['weapons_address'])
-        with open(config['abi']['weapons']) as f:
-            self.weapons_abi = json.loads(f.read())
-        self.weapons_contract = self.w3.eth.contract(address=self.weapons_address, abi=self.weapons_abi)
-        # characters
         self.characters_address = self.w3.toChecksumAddress(self.config['characters_address'])
-        with open(config['abi']['characters']) as f:
-            self.characters_abi = json.loads(f.read())
-        self.characters_contract = self.w3.eth.contract(address=self.characters_address, abi=self.characters_abi)
-        # shields
         self.shields_address = self.w3.toChecksumAddress(self.config['shields_address'])
-        with open(config['abi']['shields']) as f:
-            self.shields_abi = json.loads(f.read())
-        self.shields_contract = self.w3.eth.contract(address=self.shields_address, abi=self.shields_abi)
-        # market
         self.market_address = self.w3.toChecksumAddress(self.config['market_address'])
-        with open(config['abi']['market']) as f:
-            self.market_abi = json.loads(f.read())
-        self.market_contract = self.w3.eth.contract(address=self.market_address, abi=self.market_abi)
-        # raid
         self.raid_address = self.w3.toChecksumAddress(self.config['raid_address'])
-        with open(config['abi']['raid']) as f:
-            self.raid_abi = json.loads(f.read())
-        self.raid_contract = self.w3.eth.contract(address=self.raid_address, abi=self.raid_abi)
-        # skill
         self.skill_address = self.w3.toChecksumAddress(self.config['skill_address'])
-        with open(config['abi']['skill']) as f:
-            self.skill_abi = json.loads(f.read())
-        self.skill_contract = self.w3.eth.contract(address=self.skill_address, abi=self.skill_abi)
-        # treasury
         self.treasury_address = self.w3.toChecksumAddress(self.config['treasury_address'])
-        with open(config['abi']['treasury']) as f:
-            self.treasury_abi = json.loads(f.read())
-        self.treasury_contract = self.w3.eth.contract(address=self.treasury_address, abi=self.treasury_abi)
-        # pvp
         self.pvp_address = self.w3.toChecksumAddress(self.config['pvp_address'])
-        with open(config['abi']['pvp']) as f:
-            self.pvp_abi = json.loads(f.read())
-        self.pvp_contract = self.w3.eth.contract(address=self.pvp_address, abi=self.pvp_abi)
-        # quests
         self.quests_address = self.w3.toChecksumAddress(self.config['quests_address'])
-        with open(config['abi']['quests']) as f:
-            self.quests_abi = json.loads(f.read())
-        self.quests_contract = self.w3.eth.contract(address=self.quests_address, abi=self.quests_abi)
+        self.quests_cache = OrderedDict()
+        self.quests_cache_size = self.config.get('quests_cache_size', 1024)
         # bridge
         self.bridge_address = self.w3.toChecksumAddress(self.config['bridge_address'])
         # deployer
@@ -99,12 +100,68 @@ class Cryptoblades:
         if network == 'bsc':
             # king
             self.king_address = self.w3.toChecksumAddress(self.config['king_address'])
-            with open(config['abi']['king']) as f:
-                self.king_abi = json.loads(f.read())
-            self.king_contract = self.w3.eth.contract(address=self.king_address, abi=self.king_abi)
             # king tax
             self.king_tax_address = self.w3.toChecksumAddress(self.config['king_tax_address'])
 
+    def contract(self, address, name):
+        return self.w3.eth.contract(address=address, abi=load_abi(self.abi_paths[name]))
+
+    @cached_property
+    def cryptoblades_contract(self):
+        return self.contract(self.cryptoblades_address, 'cryptoblades')
+
+    @cached_property
+    def weapons_contract(self):
+        return self.contract(self.weapons_address, 'weapons')
+
+    @cached_property
+    def characters_contract(self):
+        return self.contract(self.characters_address, 'characters')
+
+    @cached_property
+    def shields_contract(self):
+        return self.contract(self.shields_address, 'shields')
+
+    @cached_property
+    def market_contract(self):
+        return self.contract(self.market_address, 'market')
+
+    @cached_property
+    def raid_contract(self):
+        return self.contract(self.raid_address, 'raid')
+
+    @cached_property
+    def skill_contract(self):
+        return self.contract(self.skill_address, 'skill')
+
+    @cached_property
+    def treasury_contract(self):
+        return self.contract(self.treasury_address, 'treasury')
+
+    @cached_property
+    def pvp_contract(self):
+        return self.contract(self.pvp_address, 'pvp')
+
+    @cached_property
+    def quests_contract(self):
+        return self.contract(self.quests_address, 'quests')
+
+    @cached_property
+    def king_contract(self):
+        return self.contract(self.king_address, 'king')
+
+    def get_async_w3(self):
+        if self.endpoint is None:
+            raise TypeError('Async provider needs an HTTP endpoint')
+        return Web3(Web3.AsyncHTTPProvider(self.endpoint), modules={'eth': (AsyncEth,)}, middlewares=[])
+
+    @contextmanager
+    def batch(self, block='latest'):
+        # requests made inside the block go out as JSON-RPC batches when it closes
+        batch = Batch(self.w3, block, self.batch_size)
+        yield batch
+        batch.execute()
+
     def get_wallet_balance(self, address):
         return self.w3.eth.get_balance(self.w3.toChecksumAddress(address))
 
@@ -216,6 +273,69 @@ class Cryptoblades:
     def get_shield_pattern(self, shield_id, block='latest'):
         return self.shields_contract.functions.getStatPattern(shield_id).call(block_identifier=block)
 
+    def get_items(self, items, block='latest'):
+        # items are (kind, id) pairs, everything is read in one Multicall at the block
+        calls = []
+        character_ids = []
+        for kind, item_id in items:
+            if kind == 'character':
+                character_ids.append(item_id)
+                calls += [
+                    Call(self.characters_address, ['get(uint256)((uint16,uint8,uint8,uint64,uint16,uint16,uint16,'
+                                                   'uint16,uint16,uint16))', item_id],
+                         [[f'character_stats_{item_id}', None]]),
+                    Call(self.characters_address, ['getPower(uint256)(uint24)', item_id],
+                         [[f'character_power_{item_id}', None]]),
+                    Call(self.characters_address, ['getTotalPower(uint256)(uint256)', item_id],
+                         [[f'character_total_power_{item_id}', None]]),
+                    Call(self.characters_address, ['getStaminaPoints(uint256)(uint8)', item_id],
+                         [[f'character_stamina_{item_id}', None]]),
+                    Call(self.characters_address, ['nftVars(uint256,uint256)(uint256)', item_id, 103],
+                         [[f'character_rep_{item_id}', None]]),
+                ]
+            elif kind == 'weapon' or kind == 'shield':
+                address = self.weapons_address if kind == 'weapon' else self.shields_address
+                stats = '(uint16,uint16,uint16,uint16,uint8,uint32,uint24,uint24,uint24)' if kind == 'weapon' \
+                    else '(uint16,uint16,uint16,uint16)'
+                calls += [
+                    Call(address, ['getTrait(uint256)(uint8)', item_id], [[f'{kind}_trait_{item_id}', None]]),
+                    Call(address, ['getStars(uint256)(uint8)', item_id], [[f'{kind}_stars_{item_id}', None]]),
+                    Call(address, [f'get(uint256)({stats})', item_id], [[f'{kind}_stats_{item_id}', None]]),
+                    Call(address, ['getStatPattern(uint256)(uint8)', item_id], [[f'{kind}_pattern_{item_id}', None]]),
+                ]
+                # fight data depends on the item trait, read all four instead of a second round
+                calls += [Call(address, ['getFightData(uint256,uint8)((int128,int128,uint24,uint8))', item_id, trait],
+                               [[f'{kind}_fight_data_{item_id}_{trait}', None]]) for trait in range(4)]
+            else:
+                raise TypeError(f'Wrong item kind {kind}')
+        if character_ids:
+            calls.append(Call(self.cryptoblades_address, ['getXpRewards(uint256[])(uint256[])', character_ids],
+                              [['character_unclaimed_exp', None]]))
+        if not calls:
+            return {}
+        result = Multicall(calls, _w3=self.w3, block_id=None if block == 'latest' else block)()
+        items_data = {}
+        for kind, item_id in items:
+            if kind == 'character':
+                items_data[(kind, item_id)] = {
+                    'stats': result[f'character_stats_{item_id}'],
+                    'power': result[f'character_power_{item_id}'],
+                    'total_power': result[f'character_total_power_{item_id}'],
+                    'stamina': result[f'character_stamina_{item_id}'],
+                    'unclaimed_exp': result['character_unclaimed_exp'][character_ids.index(item_id)],
+                    'rep': result[f'character_rep_{item_id}'],
+                }
+            else:
+                trait = result[f'{kind}_trait_{item_id}']
+                items_data[(kind, item_id)] = {
+                    'trait': trait,
+                    'stars': result[f'{kind}_stars_{item_id}'],
+                    'fight_data': result[f'{kind}_fight_data_{item_id}_{trait}'],
+                    'stats': result[f'{kind}_stats_{item_id}'],
+                    'pattern': result[f'{kind}_pattern_{item_id}'],
+                }
+        return items_data
+
     def get_skill_balance(self, address, block='latest'):
         return self.skill_contract.functions.balanceOf(self.w3.toChecksumAddress(address)).call(block_identifier=block)
 
@@ -226,7 +346,26 @@ class Cryptoblades:
         return self.treasury_contract.functions.getRemainingPartnerTokenSupply(project_id).call(block_identifier=block)
 
     def get_quests(self, quest_id, block='latest'):
-        return self.quests_contract.functions.quests(quest_id).call(block_identifier=block)
+        quest = self.get_cached_quest(quest_id)
+        if quest is None:
+            quest = self.quests_contract.functions.quests(quest_id).call(block_identifier=block)
+            self.cache_quest(quest_id, quest)
+        return quest
+
+    def get_cached_quest(self, quest_id):
+        quest = self.quests_cache.get(quest_id)
+        if quest is not None:
+            self.quests_cache.move_to_end(quest_id)
+        return quest
+
+    def cache_quest(self, quest_id, quest):
+        # unknown quests read as zeros, don't cache them
+        if quest[0] != quest_id:
+            return
+        self.quests_cache[quest_id] = quest
+        self.quests_cache.move_to_end(quest_id)
+        if len(self.quests_cache) > self.quests_cache_size:
+            self.quests_cache.popitem(last=False)
 
     def ether(self, wei: int) -> float:
         return float(self.w3.fromWei(wei, 'ether'))
@@ -1,11 +1,11 @@
-import yaml
 from pymongo import MongoClient
 
+from cryptoblades import load_config
+
 
 class DB:
     def __init__(self):
-        with open('config.yaml') as f:
-            config = yaml.full_load(f)
+        config = load_config()
         self.config = config['mongodb']
         self.client = MongoClient(f'mongodb://{self.config["login"]}:{self.config["password"]}@'
                                   f'{self.config["host"]}:{self.config["port"]}/?authSource={self.config["source"]}')
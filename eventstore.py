@@ -0,0 +1,32 @@
+from pymongo import ASCENDING
+from pymongo.errors import BulkWriteError
+
+# mongo integers are signed 64 bit
+MAX_INT = 2 ** 63 - 1
+
+
+def document(row):
+    return {key: str(value) if isinstance(value, int) and not isinstance(value, bool) and abs(value) > MAX_INT
+            else value for key, value in row.items()}
+
+
+class EventStore:
+    def __init__(self, collection):
+        self.collection = collection
+        # a block replayed after a restart must not store its events twice
+        self.collection.create_index([('hash', ASCENDING), ('log_index', ASCENDING)], unique=True)
+        self.collection.create_index([('event', ASCENDING), ('block', ASCENDING)])
+        self.collection.create_index('block')
+
+    def append(self, rows):
+        # returns the rows that were not stored before
+        if not rows:
+            return []
+        try:
+            self.collection.insert_many([document(row) for row in rows], ordered=False)
+        except BulkWriteError as err:
+            if any(error['code'] != 11000 for error in err.details['writeErrors']):
+                raise
+            duplicates = {error['index'] for error in err.details['writeErrors']}
+            return [row for i, row in enumerate(rows) if i not in duplicates]
+        return rows
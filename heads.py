@@ -0,0 +1,125 @@
+import asyncio
+import json
+import socket
+import sys
+import threading
+import time
+
+import websockets
+
+SUBSCRIBE = {'jsonrpc': '2.0', 'id': 1, 'method': 'eth_subscribe', 'params': ['newHeads']}
+
+
+class Heads:
+    def __init__(self, network, cb, min_interval=0.2, max_interval=10):
+        self.network = network
+        self.cb = cb
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.head = None
+        self.head_time = None
+        # seconds between blocks as seen here, starts from a guess
+        self.block_time = 3.0
+        self.subscribed = False
+        self.event = threading.Event()
+        self.lock = threading.Lock()
+        self.ws_path = cb.config.get('path_ws')
+        if cb.path is not None:
+            threading.Thread(target=self.subscribe_ipc, args=(cb.path,), daemon=True).start()
+        elif self.ws_path is not None:
+            threading.Thread(target=self.subscribe_ws, args=(self.ws_path,), daemon=True).start()
+
+    def observe(self, number):
+        with self.lock:
+            now = time.monotonic()
+            if self.head is None or number > self.head:
+                if self.head is not None:
+                    self.block_time = 0.8 * self.block_time + 0.2 * (now - self.head_time) / (number - self.head)
+                self.head = number
+                self.head_time = now
+                self.event.set()
+
+    def latest(self):
+        # a subscription that went quiet for several blocks is not trusted
+        if self.subscribed and self.head is not None and \
+                time.monotonic() - self.head_time < max(3 * self.block_time, self.max_interval):
+            return self.head
+        number = self.cb.get_latest_block_number()
+        self.observe(number)
+        return number
+
+    def interval(self):
+        # poll twice per block, expected block comes a bit later than the last one
+        return min(max(self.block_time / 2, self.min_interval), self.max_interval)
+
+    def wait(self):
+        # returns once a new head may be there
+        if self.subscribed:
+            self.event.wait(self.max_interval)
+        else:
+            self.event.wait(self.interval())
+        self.event.clear()
+
+    def notification(self, message):
+        if message.get('method') == 'eth_subscription':
+            self.observe(int(message['params']['result']['number'], 16))
+        elif message.get('id') == SUBSCRIBE['id']:
+            if 'error' in message:
+                raise ConnectionError(message['error'])
+            self.subscribed = True
+            print(f'{self.network} subscribed to newHeads')
+
+    def subscribe_ipc(self, path):
+        decoder = json.JSONDecoder()
+        while True:
+            try:
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                    sock.connect(path)
+                    sock.sendall(json.dumps(SUBSCRIBE).encode())
+                    buffer = ''
+                    while True:
+                        data = sock.recv(65536)
+                        if not data:
+                            raise ConnectionError('ipc closed')
+                        buffer += data.decode()
+                        while buffer:
+                            buffer = buffer.lstrip()
+                            try:
+                                message, end = decoder.raw_decode(buffer)
+                            except ValueError:
+                                break
+                            buffer = buffer[end:]
+                            self.notification(message)
+            except (OSError, ConnectionError) as err:
+                self.subscribed = False
+                print(f'{self.network} newHeads {err}, polling')
+                time.sleep(5)
+
+    def subscribe_ws(self, url):
+        async def subscribe():
+            async with websockets.connect(url, max_size=None) as ws:
+                await ws.send(json.dumps(SUBSCRIBE))
+                async for message in ws:
+                    self.notification(json.loads(message))
+            raise ConnectionError('ws closed')
+
+        while True:
+            try:
+                asyncio.run(subscribe())
+            except Exception as err:
+                self.subscribed = False
+                print(f'{self.network} newHeads {err}, polling')
+                time.sleep(5)
+
+
+if __name__ == '__main__':
+    # python heads.py network [ipc path], prints heads as they arrive
+    from cryptoblades import Cryptoblades
+    heads = Heads(sys.argv[1], Cryptoblades(network=sys.argv[1], path=sys.argv[2] if len(sys.argv) > 2 else None))
+    last = None
+    while True:
+        latest = heads.latest()
+        if latest != last:
+            print(f'{latest} block time {heads.block_time:.2f}s subscribed {heads.subscribed}')
+            last = latest
+        heads.wait()
@@ -0,0 +1,47 @@
+from collections import namedtuple
+
+ADD_LISTING = '0x346710fd'
+CHANGE_LISTING_PRICE = '0xed9999ca'
+PURCHASE_LISTING = '0xa6f95726'
+PURCHASE_BURN_CHARACTER = '0x9642b3f7'
+
+# selector: (status, number of static arguments)
+METHODS = {
+    ADD_LISTING: ('Listed', 4),
+    CHANGE_LISTING_PRICE: ('Relisted', 3),
+    PURCHASE_LISTING: ('Sold', 3),
+    PURCHASE_BURN_CHARACTER: ('Sold', 2),
+}
+
+ZERO_ADDRESS = '0x0000000000000000000000000000000000000000'
+
+Action = namedtuple('Action', ['method', 'status', 'token', 'token_address', 'id', 'price', 'target_buyer'])
+
+
+class Classifier:
+    def __init__(self, characters_address, weapons_address, shields_address):
+        self.characters_address = characters_address
+        self.tokens = {
+            characters_address.lower(): ('character', characters_address),
+            weapons_address.lower(): ('weapon', weapons_address),
+            shields_address.lower(): ('shield', shields_address),
+        }
+
+    def classify(self, txn_input):
+        method = txn_input[:10]
+        if method not in METHODS:
+            return None
+        status, arguments = METHODS[method]
+        # arguments are static, every one takes a 32 bytes word right after the selector
+        if len(txn_input) < 10 + 64 * arguments:
+            return None
+        words = [txn_input[10 + 64 * i:74 + 64 * i] for i in range(arguments)]
+        if method == PURCHASE_BURN_CHARACTER:
+            # _id, _maxPrice, only characters can be burned
+            return Action(method, status, 'character', self.characters_address, int(words[0], 16),
+                          int(words[1], 16), None)
+        token = self.tokens.get('0x' + words[0][24:])
+        if token is None:
+            return None
+        target_buyer = '0x' + words[3][24:] if method == ADD_LISTING else None
+        return Action(method, status, token[0], token[1], int(words[1], 16), int(words[2], 16), target_buyer)
@@ -1,632 +1,257 @@
+import asyncio
 import logging
+import sys
 import threading
 import time
 import warnings
 
 import backoff
+import requests
+from eth_utils import event_abi_to_log_topic, to_checksum_address
 from multicall import Call, Multicall
-from prometheus_client import Gauge, CollectorRegistry
-from prometheus_client.exposition import default_handler, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import Counter, Gauge, CollectorRegistry
 
-from cryptoblades import Cryptoblades
+from archive import EventArchive
+from checkpoint import MongoCheckpoint
+from cryptoblades import Cryptoblades, mulu
 from db import DB
+from eventstore import EventStore
+from heads import Heads
+from supervisor import Supervisor, load_groups
+from vm import VictoriaMetrics
 
 logging.getLogger('backoff').addHandler(logging.StreamHandler())
 
 warnings.filterwarnings('ignore')
 
 
-class Metrics:
-    def __init__(self, network, path=None):
+# metric, documentation, contract, signature, args, converter, networks
+CALLS = [
+    ('cb_var_hourly_income', 'VAR_HOURLY_INCOME', 'cryptoblades', 'vars(uint256)(uint256)', [1], 'ether', None),
+    ('cb_var_hourly_fights', 'VAR_HOURLY_FIGHTS', 'cryptoblades', 'vars(uint256)(uint256)', [2], None, None),
+    ('cb_var_hourly_power_sum', 'VAR_HOURLY_POWER_SUM', 'cryptoblades', 'vars(uint256)(uint256)', [3], None, None),
+    ('cb_var_hourly_power_average', 'VAR_HOURLY_POWER_AVERAGE', 'cryptoblades', 'vars(uint256)(uint256)', [4],
+     None, None),
+    ('cb_var_hourly_pay_per_fight', 'VAR_HOURLY_PAY_PER_FIGHT', 'cryptoblades', 'vars(uint256)(uint256)', [5],
+     'ether', None),
+    ('cb_var_hourly_timestamp', 'VAR_HOURLY_TIMESTAMP', 'cryptoblades', 'vars(uint256)(uint256)', [6], None, None),
+    ('cb_var_daily_max_claim', 'VAR_DAILY_MAX_CLAIM', 'cryptoblades', 'vars(uint256)(uint256)', [7], 'ether', None),
+    ('cb_var_claim_deposit_amount', 'VAR_CLAIM_DEPOSIT_AMOUNT', 'cryptoblades', 'vars(uint256)(uint256)', [8],
+     'ether', None),
+    ('cb_var_param_payout_income_percent', 'VAR_PARAM_PAYOUT_INCOME_PERCENT', 'cryptoblades',
+     'vars(uint256)(uint256)', [9], None, None),
+    ('cb_var_param_daily_claim_fights_limit', 'VAR_PARAM_DAILY_CLAIM_FIGHTS_LIMIT', 'cryptoblades',
+     'vars(uint256)(uint256)', [10], None, None),
+    ('cb_var_param_daily_claim_deposit_percent', 'VAR_PARAM_DAILY_CLAIM_DEPOSIT_PERCENT', 'cryptoblades',
+     'vars(uint256)(uint256)', [11], None, None),
+    ('cb_var_param_max_fight_payout', 'VAR_PARAM_MAX_FIGHT_PAYOUT', 'cryptoblades', 'vars(uint256)(uint256)', [12],
+     'ether', None),
+    ('cb_var_hourly_distribution', 'VAR_HOURLY_DISTRIBUTION', 'cryptoblades', 'vars(uint256)(uint256)', [13],
+     'ether', None),
+    ('cb_var_unclaimed_skill', 'VAR_UNCLAIMED_SKILL', 'cryptoblades', 'vars(uint256)(uint256)', [14], 'ether', None),
+    ('cb_var_hourly_max_power_average', 'VAR_HOURLY_MAX_POWER_AVERAGE', 'cryptoblades', 'vars(uint256)(uint256)',
+     [15], None, None),
+    ('cb_var_param_hourly_max_power_percent', 'VAR_PARAM_HOURLY_MAX_POWER_PERCENT', 'cryptoblades',
+     'vars(uint256)(uint256)', [16], None, None),
+    ('cb_var_param_significant_hour_fights', 'VAR_PARAM_SIGNIFICANT_HOUR_FIGHTS', 'cryptoblades',
+     'vars(uint256)(uint256)', [17], None, None),
+    ('cb_var_param_hourly_pay_allowance', 'VAR_PARAM_HOURLY_PAY_ALLOWANCE', 'cryptoblades', 'vars(uint256)(uint256)',
+     [18], 'ether', None),
+    ('cb_var_mint_weapon_fee_decrease_speed', 'VAR_MINT_WEAPON_FEE_DECREASE_SPEED', 'cryptoblades',
+     'vars(uint256)(uint256)', [19], None, None),
+    ('cb_var_mint_character_fee_decrease_speed', 'VAR_MINT_CHARACTER_FEE_DECREASE_SPEED', 'cryptoblades',
+     'vars(uint256)(uint256)', [20], None, None),
+    ('cb_var_weapon_fee_increase', 'VAR_WEAPON_FEE_INCREASE', 'cryptoblades', 'vars(uint256)(uint256)', [21],
+     None, None),
+    ('cb_var_character_fee_increase', 'VAR_CHARACTER_FEE_INCREASE', 'cryptoblades', 'vars(uint256)(uint256)', [22],
+     None, None),
+    ('cb_var_min_weapon_fee', 'VAR_MIN_WEAPON_FEE', 'cryptoblades', 'vars(uint256)(uint256)', [23], None, None),
+    ('cb_var_min_character_fee', 'VAR_MIN_CHARACTER_FEE', 'cryptoblades', 'vars(uint256)(uint256)', [24], None, None),
+    ('cb_var_weapon_mint_timestamp', 'VAR_WEAPON_MINT_TIMESTAMP', 'cryptoblades', 'vars(uint256)(uint256)', [25],
+     None, None),
+    ('cb_var_character_mint_timestamp', 'VAR_CHARACTER_MINT_TIMESTAMP', 'cryptoblades', 'vars(uint256)(uint256)',
+     [26], None, None),
+    ('cb_fight_xp_gain', 'fightXpGain', 'cryptoblades', 'fightXpGain()(uint256)', [], None, None),
+    ('cb_mint_character_fee_usd', 'mintCharacterFee', 'cryptoblades', 'mintCharacterFee()(int128)', [],
+     'usd', None),
+    ('cb_mint_character_fee_dynamic_usd', 'getMintCharacterFee', 'cryptoblades', 'getMintCharacterFee()(int128)', [],
+     'usd', None),
+    ('cb_mint_weapon_fee_usd', 'mintWeaponFee', 'cryptoblades', 'mintWeaponFee()(int128)', [], 'usd', None),
+    ('cb_mint_weapon_fee_dynamic_usd', 'getMintWeaponFee', 'cryptoblades', 'getMintWeaponFee()(int128)', [],
+     'usd', None),
+    ('cb_reforge_weapon_fee_usd', 'reforgeWeaponFee', 'cryptoblades', 'reforgeWeaponFee()(int128)', [], 'usd', None),
+    ('cb_reforge_weapon_with_dust_fee_usd', 'reforgeWeaponWithDustFee', 'cryptoblades',
+     'reforgeWeaponWithDustFee()(int128)', [], 'usd', None),
+    ('cb_burn_weapon_fee_usd', 'burnWeaponFee', 'cryptoblades', 'burnWeaponFee()(int128)', [], 'usd', None),
+    ('cb_weapon_burn_point_multiplier', 'burnPointMultiplier', 'weapons', 'burnPointMultiplier()(uint256)', [],
+     None, None),
+    ('cb_weapon_total_supply', 'totalSupply', 'weapons', 'totalSupply()(uint256)', [], None, None),
+    ('cb_character_total_supply', 'totalSupply', 'characters', 'totalSupply()(uint256)', [], None, None),
+    ('cb_shield_total_supply', 'totalSupply', 'shields', 'totalSupply()(uint256)', [], None, None),
+    ('cb_reward_pool_skill', 'balanceOf', 'skill', 'balanceOf(address)(uint256)', ['cryptoblades_address'],
+     'ether', None),
+    ('cb_bridge_pool_skill', 'balanceOf', 'skill', 'balanceOf(address)(uint256)', ['bridge_address'],
+     'ether', ['bsc', 'heco', 'oec', 'poly', 'avax']),
+    ('cb_treasury_skill_multiplier', 'getProjectMultiplier', 'treasury', 'getProjectMultiplier(uint256)(uint256)',
+     ['treasury_skill_id'], 'ether', None),
+    ('cb_treasury_skill_remaining_supply', 'getRemainingPartnerTokenSupply', 'treasury',
+     'getRemainingPartnerTokenSupply(uint256)(uint256)', ['treasury_skill_id'], 'ether', None),
+    ('cbk_tax_pool_king', 'balanceOf', 'king', 'balanceOf(address)(uint256)', ['king_tax_address'], 'ether', ['bsc']),
+    ('cb_deployer_wallet_balance', 'Balance', 'multicall', 'getEthBalance(address)(uint256)', ['deployer_address'],
+     'ether', None),
+    ('cb_tokens_wallet_balance', 'Balance', 'multicall', 'getEthBalance(address)(uint256)', ['tokens_address'],
+     'ether', None),
+    ('cb_raid_bot_wallet_balance', 'Balance', 'multicall', 'getEthBalance(address)(uint256)', ['raid_bot_address'],
+     'ether', None),
+    ('cb_bridge_bot_wallet_balance', 'Balance', 'multicall', 'getEthBalance(address)(uint256)', ['bridge_bot_address'],
+     'ether', None),
+    ('cb_pvp_bot_wallet_balance', 'Balance', 'multicall', 'getEthBalance(address)(uint256)', ['pvp_bot_address'],
+     'ether', None),
+]
+
+# refresh cadence group of the CALLS metrics that rarely change, the rest and the raid are read every block
+CALL_GROUPS = {
+    'params': ['cb_var_daily_max_claim', 'cb_var_claim_deposit_amount', 'cb_var_param_payout_income_percent',
+               'cb_var_param_daily_claim_fights_limit', 'cb_var_param_daily_claim_deposit_percent',
+               'cb_var_param_max_fight_payout', 'cb_var_param_hourly_max_power_percent',
+               'cb_var_param_significant_hour_fights', 'cb_var_param_hourly_pay_allowance',
+               'cb_var_mint_weapon_fee_decrease_speed', 'cb_var_mint_character_fee_decrease_speed',
+               'cb_var_weapon_fee_increase', 'cb_var_character_fee_increase', 'cb_var_min_weapon_fee',
+               'cb_var_min_character_fee', 'cb_fight_xp_gain', 'cb_weapon_burn_point_multiplier'],
+    'wallets': ['cb_deployer_wallet_balance', 'cb_tokens_wallet_balance', 'cb_raid_bot_wallet_balance',
+                'cb_bridge_bot_wallet_balance', 'cb_pvp_bot_wallet_balance'],
+}
+# blocks between reads of a group
+CALL_CADENCES = {'block': 1, 'params': 100, 'wallets': 20}
+
+VM_IMPORT_URL = 'http://127.0.0.1:8428/api/v1/import/prometheus'
+
+# metric, documentation, converter in getRaidData output order
+RAID_DATA = [
+    ('cb_raid_index', 'index', None),
+    ('cb_raid_end_time', 'endTime', None),
+    ('cb_raid_raider_count', 'raiderCount', None),
+    ('cb_raid_player_power', 'playerPower', None),
+    ('cb_raid_boss_power', 'bossPower', None),
+    ('cb_raid_trait', 'trait', None),
+    ('cb_raid_status', 'status', None),
+    ('cb_raid_join_skill', 'joinSkill', 'ether'),
+    ('cb_raid_stamina', 'stamina', None),
+    ('cb_raid_durability', 'durability', None),
+    ('cb_raid_xp', 'xp', None),
+]
+
+
+class StateCalls:
+    # the state gauges read through Multicall, shared by the block loop and the backfill
+
+    # with False a failed call reads as None instead of reverting the whole Multicall
+    require_success = True
+
+    def __init__(self, network, path=None, archive=False):
         self.network = network
         self.path = path
-        self.cb = Cryptoblades(network=self.network, path=self.path)
+        self.cb = Cryptoblades(network=self.network, path=self.path, archive=archive)
         self.db = DB().client.cryptoblades
-        self.metrics_db = self.db.cb_metrics_last_block
-        self.vm = 'http://127.0.0.1:8428/api/v1/import/prometheus'
         self.job = 'cryptoblades'
         self.instance = 'metrics_v2'
+        self.vm = VictoriaMetrics(VM_IMPORT_URL, self.job, self.instance)
+        self.build_calls()
 
-    @backoff.on_exception(backoff.constant, Exception, interval=5, jitter=None)
-    def block_filter(self):
-        while True:
-            latest_block = self.cb.get_latest_block_number()
-            try:
-                last_block = self.metrics_db.find_one({'network': self.network})['last_block']
-            except TypeError:
-                last_block = latest_block
-                self.metrics_db.insert_one({'network': self.network, 'last_block': latest_block})
-            if latest_block - 2 >= last_block:
-                block_info = self.cb.w3.eth.get_block(last_block)
-                timestamp = block_info['timestamp']
-                events_data = self.events(last_block)
-                if events_data:
-                    self.push_to_vm(events_data, timestamp)
-                if latest_block - last_block <= 15:
-                    calls_data = self.calls(last_block)
-                    self.push_to_vm(calls_data, timestamp)
-                self.metrics_db.update_one({'network': self.network}, {'$set': {'last_block': last_block + 1}})
-            time.sleep(0.5)
-
-    def events(self, last_block):
-        contracts = [self.cb.quests_address,
-                     self.cb.pvp_address,
-                     self.cb.characters_address,
-                     self.cb.weapons_address,
-                     self.cb.shields_address]
-        if self.network == 'avax':
-            contracts.remove(self.cb.pvp_address)
-        logs = self.cb.w3.eth.get_logs({'fromBlock': last_block, 'toBlock': last_block,
-                                        'address': contracts})
-        if logs:
-            events_registry = CollectorRegistry()
-            # quests
-            quest_complete_metric = Gauge('cb_quest_complete', 'QuestComplete',
-                                          ['network', 'tier', 'quest', 'character',
-                                           'user', 'block', 'hash'],
-                                          registry=events_registry)
-            quest_skipped_metric = Gauge('cb_quest_skipped', 'QuestSkipped',
-                                         ['network', 'tier', 'quest', 'character',
-                                          'user', 'block', 'hash'],
-                                         registry=events_registry)
-            quest_assigned_metric = Gauge('cb_quest_assigned', 'QuestAssigned',
-                                          ['network', 'tier', 'quest', 'character',
-                                           'user', 'block', 'hash'],
-                                          registry=events_registry)
-            quest_weekly_reward_metric = Gauge('cb_quest_weekly_reward_claimed', 'WeeklyRewardClaimed',
-                                               ['network', 'user', 'block', 'hash'],
-                                               registry=events_registry)
-            # pvp
-            pvp_duel_finished_metric = Gauge('cb_pvp_duel_finished', 'DuelFinished',
-                                             ['network', 'attacker', 'defender',
-                                              'attacker_roll', 'defender_roll',
-                                              'attacker_won', 'bonus_rank', 'block', 'hash'],
-                                             registry=events_registry)
-            # characters
-            character_minted_metric = Gauge('cb_character_minted', 'NewCharacter',
-                                            ['network', 'character',
-                                             'user', 'block', 'hash'],
-                                            registry=events_registry)
-            character_burned_metric = Gauge('cb_character_burned', 'Burned',
-                                            ['network', 'character', 'character_level',
-                                             'user', 'block', 'hash'],
-                                            registry=events_registry)
-            # weapons
-            weapon_minted_metric = Gauge('cb_weapon_minted', 'NewWeapon',
-                                         ['network', 'weapon', 'weapon_stars', 'weapon_type',
-                                          'user', 'block', 'hash'],
-                                         registry=events_registry)
-            weapon_burned_metric = Gauge('cb_weapon_burned', 'Burned',
-                                         ['network', 'weapon', 'weapon_stars',
-                                          'user', 'block', 'hash'],
-                                         registry=events_registry)
-            # shields
-            shield_minted_metric = Gauge('cb_shield_minted', 'NewShield',
-                                         ['network', 'shield', 'shield_stars',
-                                          'user', 'block', 'hash'],
-                                         registry=events_registry)
-            shield_burned_metric = Gauge('cb_shield_burned', 'Burned',
-                                         ['network', 'shield', 'shield_stars',
-                                          'user', 'block', 'hash'],
-                                         registry=events_registry)
-            _txn_hash = None
-            for log in logs:
-                txn_hash = log['transactionHash']
-                if txn_hash != _txn_hash:
-                    txn_receipt = self.cb.w3.eth.get_transaction_receipt(txn_hash)
-                    addresses = []
-                    for address in txn_receipt['logs']:
-                        addresses.append(address['address'])
-                    # quests
-                    if self.cb.quests_address in addresses:
-                        quest_complete = self.cb.quests_contract.events.QuestComplete().processReceipt(txn_receipt)
-                        if quest_complete:
-                            for event in quest_complete:
-                                quest = event['args']['questID']
-                                character = event['args']['characterID']
-                                tier = self.cb.get_quests(quest, block=last_block)[1]
-                                user = txn_receipt['from']
-                                print(self.network, last_block, 'QuestComplete')
-                                quest_complete_metric.labels(self.network, tier, quest, character,
-                                                             user, last_block, txn_hash.hex()).inc()
-                        quest_skipped = self.cb.quests_contract.events.QuestSkipped().processReceipt(txn_receipt)
-                        if quest_skipped:
-                            for event in quest_skipped:
-                                quest = event['args']['questID']
-                                character = event['args']['characterID']
-                                tier = self.cb.get_quests(quest, block=last_block)[1]
-                                user = txn_receipt['from']
-                                print(self.network, last_block, 'QuestSkipped')
-                                quest_skipped_metric.labels(self.network, tier, quest, character,
-                                                            user, last_block, txn_hash.hex()).inc()
-                        quest_assigned = self.cb.quests_contract.events.QuestAssigned().processReceipt(txn_receipt)
-                        if quest_assigned:
-                            for event in quest_assigned:
-                                quest = event['args']['questID']
-                                character = event['args']['characterID']
-                                tier = self.cb.get_quests(quest, block=last_block)[1]
-                                user = txn_receipt['from']
-                                print(self.network, last_block, 'QuestAssigned')
-                                quest_assigned_metric.labels(self.network, tier, quest, character,
-                                                             user, last_block, txn_hash.hex()).inc()
-                        weekly_reward_claimed = self.cb.quests_contract.events.WeeklyRewardClaimed().processReceipt(txn_receipt)
-                        if weekly_reward_claimed:
-                            user = txn_receipt['from']
-                            print(self.network, last_block, 'WeeklyRewardClaimed')
-                            quest_weekly_reward_metric.labels(self.network, user, last_block, txn_hash.hex()).inc()
-                    # pvp
-                    if self.cb.pvp_address in addresses:
-                        pvp_duel_finished = self.cb.pvp_contract.events.DuelFinished().processReceipt(txn_receipt)
-                        if pvp_duel_finished:
-                            for event in pvp_duel_finished:
-                                attacker = event['args']['attacker']
-                                defender = event['args']['defender']
-                                attacker_roll = event['args']['attackerRoll']
-                                defender_roll = event['args']['defenderRoll']
-                                attacker_won = event['args']['attackerWon']
-                                bonus_rank = event['args']['bonusRank']
-                                print(self.network, last_block, 'DuelFinished')
-                                pvp_duel_finished_metric.labels(self.network, attacker, defender,
-                                                                attacker_roll, defender_roll,
-                                                                attacker_won, bonus_rank, last_block, txn_hash.hex()).inc()
-                    # characters
-                    if self.cb.characters_address in addresses:
-                        character_minted = self.cb.characters_contract.events.NewCharacter().processReceipt(txn_receipt)
-                        if character_minted:
-                            for event in character_minted:
-                                character = event['args']['character']
-                                user = event['args']['minter']
-                                print(self.network, last_block, 'NewCharacter')
-                                character_minted_metric.labels(self.network, character, user, last_block, txn_hash.hex()).inc()
-                        character_burned = self.cb.characters_contract.events.Burned().processReceipt(txn_receipt)
-                        if character_burned:
-                            for event in character_burned:
-                                character = event['args']['id']
-                                character_level = self.cb.get_character_level(character, block=last_block)
-                                user = event['args']['owner']
-                                print(self.network, last_block, 'Burned (character)')
-                                character_burned_metric.labels(self.network, character, character_level,
-                                                               user, last_block, txn_hash.hex()).inc()
-                    # weapons
-                    if self.cb.weapons_address in addresses:
-                        weapon_minted = self.cb.weapons_contract.events.NewWeapon().processReceipt(txn_receipt)
-                        if weapon_minted:
-                            for event in weapon_minted:
-                                weapon = event['args']['weapon']
-                                weapon_stars = self.cb.get_weapon_stars(weapon)  # NFL
-                                weapon_type = event['args']['weaponType']
-                                user = event['args']['minter']
-                                print(self.network, last_block, 'NewWeapon')
-                                weapon_minted_metric.labels(self.network, weapon, weapon_stars, weapon_type,
-                                                            user, last_block, txn_hash.hex()).inc()
-                        weapon_burned = self.cb.weapons_contract.events.Burned().processReceipt(txn_receipt)
-                        if weapon_burned:
-                            for event in weapon_burned:
-                                weapon = event['args']['burned']
-                                weapon_stars = self.cb.get_weapon_stars(weapon, block=last_block)
-                                user = event['args']['owner']
-                                print(self.network, last_block, 'Burned (weapon)')
-                                weapon_burned_metric.labels(self.network, weapon, weapon_stars,
-                                                            user, last_block, txn_hash.hex()).inc()
-                    # shields
-                    if self.cb.shields_address in addresses:
-                        shield_minted = self.cb.shields_contract.events.NewShield().processReceipt(txn_receipt)
-                        if shield_minted:
-                            for event in shield_minted:
-                                shield = event['args']['shield']
-                                shield_stars = self.cb.get_shield_stars(shield)  # NFL
-                                user = event['args']['minter']
-                                print(self.network, last_block, 'NewShield')
-                                shield_minted_metric.labels(self.network, shield, shield_stars,
-                                                            user, last_block, txn_hash.hex()).inc()
-                        shield_burned = self.cb.shields_contract.events.Burned().processReceipt(txn_receipt)
-                        if shield_burned:
-                            for event in shield_burned:
-                                shield = event['args']['shield']
-                                shield_stars = self.cb.get_shield_stars(shield, block=last_block)
-                                user = event['args']['burner']
-                                print(self.network, last_block, 'Burned (shield)')
-                                shield_burned_metric.labels(self.network, shield, shield_stars,
-                                                            user, last_block, txn_hash.hex()).inc()
-                _txn_hash = txn_hash
-            return events_registry
+    def build_calls(self):
+        self.calls_registry = CollectorRegistry()
+        self.calls_gauges = {'cb_block_number': Gauge('cb_block_number', 'Block', ['network'],
+                                                      registry=self.calls_registry)}
+        # the Calls are built on the first read, see call_groups
+        self.calls_groups = None
+        self.calls_cadences = {**CALL_CADENCES, **self.cb.config.get('calls_cadences', {})}
+        self.calls_read = set()
+        self.calls_usd = []
+        # last pushed values, unchanged samples are only sent with the periodic full refresh
+        self.calls_last = {}
+        self.calls_changed = set()
+        self.calls_full_refresh = self.cb.config.get('calls_full_refresh', 120)
+        self.calls_full_time = 0
+        for metric, documentation, contract, signature, args, converter, networks in CALLS:
+            if networks is not None and self.network not in networks:
+                continue
+            if converter == 'usd':
+                self.calls_usd.append(metric)
+            self.calls_gauges[metric] = Gauge(metric, documentation, ['network'], registry=self.calls_registry)
+        for metric, documentation, _ in RAID_DATA:
+            self.calls_gauges[metric] = Gauge(metric, documentation, ['network'], registry=self.calls_registry)
+        # learned from the first read, until then the fees go through usdToSkill
+        self.price_oracle = None
 
-    def calls(self, last_block):
-        t1_start = time.perf_counter()
-        calls_registry = CollectorRegistry()
-        calls_list = []
-        calls_usd_list = []
-
-        # metrics define
-
-        block_number_metric = Gauge('cb_block_number',
-                                    'Block',
-                                    ['network'], registry=calls_registry)
-        var_hourly_income_metric = Gauge('cb_var_hourly_income',
-                                         'VAR_HOURLY_INCOME',
-                                         ['network'], registry=calls_registry)
-        var_hourly_fights_metric = Gauge('cb_var_hourly_fights',
-                                         'VAR_HOURLY_FIGHTS',
-                                         ['network'], registry=calls_registry)
-        var_hourly_power_sum_metric = Gauge('cb_var_hourly_power_sum',
-                                            'VAR_HOURLY_POWER_SUM',
-                                            ['network'], registry=calls_registry)
-        var_hourly_power_average_metric = Gauge('cb_var_hourly_power_average',
-                                                'VAR_HOURLY_POWER_AVERAGE',
-                                                ['network'], registry=calls_registry)
-        var_hourly_pay_per_fight_metric = Gauge('cb_var_hourly_pay_per_fight',
-                                                'VAR_HOURLY_PAY_PER_FIGHT',
-                                                ['network'], registry=calls_registry)
-        var_hourly_timestamp_metric = Gauge('cb_var_hourly_timestamp',
-                                            'VAR_HOURLY_TIMESTAMP',
-                                            ['network'], registry=calls_registry)
-        var_daily_max_claim_metric = Gauge('cb_var_daily_max_claim',
-                                           'VAR_DAILY_MAX_CLAIM',
-                                           ['network'], registry=calls_registry)
-        var_claim_deposit_amount_metric = Gauge('cb_var_claim_deposit_amount',
-                                                'VAR_CLAIM_DEPOSIT_AMOUNT',
-                                                ['network'], registry=calls_registry)
-        var_param_payout_income_percent_metric = Gauge('cb_var_param_payout_income_percent',
-                                                       'VAR_PARAM_PAYOUT_INCOME_PERCENT',
-                                                       ['network'], registry=calls_registry)
-        var_param_daily_claim_fights_limit_metric = Gauge('cb_var_param_daily_claim_fights_limit',
-                                                          'VAR_PARAM_DAILY_CLAIM_FIGHTS_LIMIT',
-                                                          ['network'], registry=calls_registry)
-        var_param_daily_claim_deposit_percent_metric = Gauge('cb_var_param_daily_claim_deposit_percent',
-                                                             'VAR_PARAM_DAILY_CLAIM_DEPOSIT_PERCENT',
-                                                             ['network'], registry=calls_registry)
-        var_param_max_fight_payout_metric = Gauge('cb_var_param_max_fight_payout',
-                                                  'VAR_PARAM_MAX_FIGHT_PAYOUT',
-                                                  ['network'], registry=calls_registry)
-        var_hourly_distribution_metric = Gauge('cb_var_hourly_distribution',
-                                               'VAR_HOURLY_DISTRIBUTION',
-                                               ['network'], registry=calls_registry)
-        var_unclaimed_skill_metric = Gauge('cb_var_unclaimed_skill',
-                                           'VAR_UNCLAIMED_SKILL',
-                                           ['network'], registry=calls_registry)
-        var_hourly_max_power_average_metric = Gauge('cb_var_hourly_max_power_average',
-                                                    'VAR_HOURLY_MAX_POWER_AVERAGE',
-                                                    ['network'], registry=calls_registry)
-        var_param_hourly_max_power_percent_metric = Gauge('cb_var_param_hourly_max_power_percent',
-                                                          'VAR_PARAM_HOURLY_MAX_POWER_PERCENT',
-                                                          ['network'], registry=calls_registry)
-        var_param_significant_hour_fights_metric = Gauge('cb_var_param_significant_hour_fights',
-                                                         'VAR_PARAM_SIGNIFICANT_HOUR_FIGHTS',
-                                                         ['network'], registry=calls_registry)
-        var_param_hourly_pay_allowance_metric = Gauge('cb_var_param_hourly_pay_allowance',
-                                                      'VAR_PARAM_HOURLY_PAY_ALLOWANCE',
-                                                      ['network'], registry=calls_registry)
-        var_mint_weapon_fee_decrease_speed_metric = Gauge('cb_var_mint_weapon_fee_decrease_speed',
-                                                          'VAR_MINT_WEAPON_FEE_DECREASE_SPEED',
-                                                          ['network'], registry=calls_registry)
-        var_mint_character_fee_decrease_speed_metric = Gauge('cb_var_mint_character_fee_decrease_speed',
-                                                             'VAR_MINT_CHARACTER_FEE_DECREASE_SPEED',
-                                                             ['network'], registry=calls_registry)
-        var_weapon_fee_increase_metric = Gauge('cb_var_weapon_fee_increase',
-                                               'VAR_WEAPON_FEE_INCREASE',
-                                               ['network'], registry=calls_registry)
-        var_character_fee_increase_metric = Gauge('cb_var_character_fee_increase',
-                                                  'VAR_CHARACTER_FEE_INCREASE',
-                                                  ['network'], registry=calls_registry)
-        var_min_weapon_fee_metric = Gauge('cb_var_min_weapon_fee',
-                                          'VAR_MIN_WEAPON_FEE',
-                                          ['network'], registry=calls_registry)
-        var_min_character_fee_metric = Gauge('cb_var_min_character_fee',
-                                             'VAR_MIN_CHARACTER_FEE',
-                                             ['network'], registry=calls_registry)
-        var_weapon_mint_timestamp_metric = Gauge('cb_var_weapon_mint_timestamp',
-                                                 'VAR_WEAPON_MINT_TIMESTAMP',
-                                                 ['network'], registry=calls_registry)
-        var_character_mint_timestamp_metric = Gauge('cb_var_character_mint_timestamp',
-                                                    'VAR_CHARACTER_MINT_TIMESTAMP',
-                                                    ['network'], registry=calls_registry)
-        fight_xp_gain_metric = Gauge('cb_fight_xp_gain',
-                                     'fightXpGain',
-                                     ['network'], registry=calls_registry)
-        mint_character_fee_usd_metric = Gauge('cb_mint_character_fee_usd',
-                                              'mintCharacterFee',
-                                              ['network'], registry=calls_registry)
-        mint_character_fee_dynamic_usd_metric = Gauge('cb_mint_character_fee_dynamic_usd',
-                                                      'getMintCharacterFee',
-                                                      ['network'], registry=calls_registry)
-        mint_weapon_fee_usd_metric = Gauge('cb_mint_weapon_fee_usd',
-                                           'mintWeaponFee',
-                                           ['network'], registry=calls_registry)
-        mint_weapon_fee_dynamic_usd_metric = Gauge('cb_mint_weapon_fee_dynamic_usd',
-                                                   'getMintWeaponFee',
-                                                   ['network'], registry=calls_registry)
-        reforge_weapon_fee_usd_metric = Gauge('cb_reforge_weapon_fee_usd',
-                                              'reforgeWeaponFee',
-                                              ['network'], registry=calls_registry)
-        reforge_weapon_with_dust_fee_usd_metric = Gauge('cb_reforge_weapon_with_dust_fee_usd',
-                                                        'reforgeWeaponWithDustFee',
-                                                        ['network'], registry=calls_registry)
-        burn_weapon_fee_usd_metric = Gauge('cb_burn_weapon_fee_usd',
-                                           'burnWeaponFee',
-                                           ['network'], registry=calls_registry)
-        weapon_burn_point_multiplier_metric = Gauge('cb_weapon_burn_point_multiplier',
-                                                    'burnPointMultiplier',
-                                                    ['network'], registry=calls_registry)
-        weapon_total_supply_metric = Gauge('cb_weapon_total_supply',
-                                           'totalSupply',
-                                           ['network'], registry=calls_registry)
-        character_total_supply_metric = Gauge('cb_character_total_supply',
-                                              'totalSupply',
-                                              ['network'], registry=calls_registry)
-        shield_total_supply_metric = Gauge('cb_shield_total_supply',
-                                           'totalSupply',
-                                           ['network'], registry=calls_registry)
-        raid_index_metric = Gauge('cb_raid_index',
-                                  'index',
-                                  ['network'], registry=calls_registry)
-        raid_end_time_metric = Gauge('cb_raid_end_time',
-                                     'endTime',
-                                     ['network'], registry=calls_registry)
-        raid_raider_count_metric = Gauge('cb_raid_raider_count',
-                                         'raiderCount',
-                                         ['network'], registry=calls_registry)
-        raid_player_power_metric = Gauge('cb_raid_player_power',
-                                         'playerPower',
-                                         ['network'], registry=calls_registry)
-        raid_boss_power_metric = Gauge('cb_raid_boss_power',
-                                       'bossPower',
-                                       ['network'], registry=calls_registry)
-        raid_trait_metric = Gauge('cb_raid_trait',
-                                  'trait',
-                                  ['network'], registry=calls_registry)
-        raid_status_metric = Gauge('cb_raid_status',
-                                   'status',
-                                   ['network'], registry=calls_registry)
-        raid_join_skill_metric = Gauge('cb_raid_join_skill',
-                                       'joinSkill',
-                                       ['network'], registry=calls_registry)
-        raid_stamina_metric = Gauge('cb_raid_stamina',
-                                    'stamina',
-                                    ['network'], registry=calls_registry)
-        raid_durability_metric = Gauge('cb_raid_durability',
-                                       'durability',
-                                       ['network'], registry=calls_registry)
-        raid_xp_metric = Gauge('cb_raid_xp',
-                               'xp',
-                               ['network'], registry=calls_registry)
-        reward_pool_skill_metric = Gauge('cb_reward_pool_skill',
-                                         'balanceOf',
-                                         ['network'], registry=calls_registry)
-        bridge_pool_skill_metric = Gauge('cb_bridge_pool_skill',
-                                         'balanceOf',
-                                         ['network'], registry=calls_registry)
-        deployer_wallet_balance_metric = Gauge('cb_deployer_wallet_balance',
-                                               'Balance',
-                                               ['network'], registry=calls_registry)
-        tokens_wallet_balance_metric = Gauge('cb_tokens_wallet_balance',
-                                             'Balance',
-                                             ['network'], registry=calls_registry)
-        raid_bot_wallet_balance_metric = Gauge('cb_raid_bot_wallet_balance',
-                                               'Balance',
-                                               ['network'], registry=calls_registry)
-        bridge_bot_wallet_balance_metric = Gauge('cb_bridge_bot_wallet_balance',
-                                                 'Balance',
-                                                 ['network'], registry=calls_registry)
-        pvp_bot_wallet_balance_metric = Gauge('cb_pvp_bot_wallet_balance',
-                                              'Balance',
-                                              ['network'], registry=calls_registry)
-        treasury_skill_multiplier_metric = Gauge('cb_treasury_skill_multiplier',
-                                                 'getProjectMultiplier',
-                                                 ['network'], registry=calls_registry)
-        treasury_skill_remaining_supply_metric = Gauge('cb_treasury_skill_remaining_supply',
-                                                       'getRemainingPartnerTokenSupply',
-                                                       ['network'], registry=calls_registry)
-        tax_pool_king_metric = Gauge('cbk_tax_pool_king',
-                                     'balanceOf',
-                                     ['network'], registry=calls_registry)
-
-        # calls define
-
-        calls_list.append(Call(self.cb.cryptoblades_address, ['vars(uint256)(uint256)', 1],
-                               [['var_hourly_income', self.cb.ether]]))
-        calls_list.append(Call(self.cb.cryptoblades_address, ['vars(uint256)(uint256)', 2],
-                               [['var_hourly_fights', None]]))
-        calls_list.append(Call(self.cb.cryptoblades_address, ['vars(uint256)(uint256)', 3],
-                               [['var_hourly_power_sum', None]]))
-        calls_list.append(Call(self.cb.cryptoblades_address, ['vars(uint256)(uint256)', 4],
-                               [['var_hourly_power_average', None]]))
-        calls_list.append(Call(self.cb.cryptoblades_address, ['vars(uint256)(uint256)', 5],
-                               [['var_hourly_pay_per_fight', self.cb.ether]]))
-        calls_list.append(Call(self.cb.cryptoblades_address, ['vars(uint256)(uint256)', 6],
-                               [['var_hourly_timestamp', None]]))
-        calls_list.append(Call(self.cb.cryptoblades_address, ['vars(uint256)(uint256)', 7],
-                               [['var_daily_max_claim', self.cb.ether]]))
-        calls_list.append(Call(self.cb.cryptoblades_address, ['vars(uint256)(uint256)', 8],
-                               [['var_claim_deposit_amount', self.cb.ether]]))
-        calls_list.append(Call(self.cb.cryptoblades_address, ['vars(uint256)(uint256)', 9],
-                               [['var_param_payout_income_percent', None]]))
-        calls_list.append(Call(self.cb.cryptoblades_address, ['vars(uint256)(uint256)', 10],
-                               [['var_param_daily_claim_fights_limit', None]]))
-        calls_list.append(Call(self.cb.cryptoblades_address, ['vars(uint256)(uint256)', 11],
-                               [['var_param_daily_claim_deposit_percent', None]]))
-        calls_list.append(Call(self.cb.cryptoblades_address, ['vars(uint256)(uint256)', 12],
-                               [['var_param_max_fight_payout', self.cb.ether]]))
-        calls_list.append(Call(self.cb.cryptoblades_address, ['vars(uint256)(uint256)', 13],
-                               [['var_hourly_distribution', self.cb.ether]]))
-        calls_list.append(Call(self.cb.cryptoblades_address, ['vars(uint256)(uint256)', 14],
-                               [['var_unclaimed_skill', self.cb.ether]]))
-        calls_list.append(Call(self.cb.cryptoblades_address, ['vars(uint256)(uint256)', 15],
-                               [['var_hourly_max_power_average', None]]))
-        calls_list.append(Call(self.cb.cryptoblades_address, ['vars(uint256)(uint256)', 16],
-                               [['var_param_hourly_max_power_percent', None]]))
-        calls_list.append(Call(self.cb.cryptoblades_address, ['vars(uint256)(uint256)', 17],
-                               [['var_param_significant_hour_fights', None]]))
-        calls_list.append(Call(self.cb.cryptoblades_address, ['vars(uint256)(uint256)', 18],
-                               [['var_param_hourly_pay_allowance', self.cb.ether]]))
-        calls_list.append(Call(self.cb.cryptoblades_address, ['vars(uint256)(uint256)', 19],
-                               [['var_mint_weapon_fee_decrease_speed', None]]))
-        calls_list.append(Call(self.cb.cryptoblades_address, ['vars(uint256)(uint256)', 20],
-                               [['var_mint_character_fee_decrease_speed', None]]))
-        calls_list.append(Call(self.cb.cryptoblades_address, ['vars(uint256)(uint256)', 21],
-                               [['var_weapon_fee_increase', None]]))
-        calls_list.append(Call(self.cb.cryptoblades_address, ['vars(uint256)(uint256)', 22],
-                               [['var_character_fee_increase', None]]))
-        calls_list.append(Call(self.cb.cryptoblades_address, ['vars(uint256)(uint256)', 23],
-                               [['var_min_weapon_fee', None]]))
-        calls_list.append(Call(self.cb.cryptoblades_address, ['vars(uint256)(uint256)', 24],
-                               [['var_min_character_fee', None]]))
-        calls_list.append(Call(self.cb.cryptoblades_address, ['vars(uint256)(uint256)', 25],
-                               [['var_weapon_mint_timestamp', None]]))
-        calls_list.append(Call(self.cb.cryptoblades_address, ['vars(uint256)(uint256)', 26],
-                               [['var_character_mint_timestamp', None]]))
-        calls_list.append(Call(self.cb.cryptoblades_address, ['fightXpGain()(uint256)'],
-                               [['fight_xp_gain', None]]))
-        calls_list.append(Call(self.cb.cryptoblades_address, ['mintCharacterFee()(int128)'],
-                               [['mint_character_fee', None]]))
-        calls_list.append(Call(self.cb.cryptoblades_address, ['getMintCharacterFee()(int128)'],
-                               [['mint_character_fee_dynamic', None]]))
-        calls_list.append(Call(self.cb.cryptoblades_address, ['mintWeaponFee()(int128)'],
-                               [['mint_weapon_fee', None]]))
-        calls_list.append(Call(self.cb.cryptoblades_address, ['getMintWeaponFee()(int128)'],
-                               [['mint_weapon_fee_dynamic', None]]))
-        calls_list.append(Call(self.cb.cryptoblades_address, ['reforgeWeaponFee()(int128)'],
-                               [['reforge_weapon_fee', None]]))
-        calls_list.append(Call(self.cb.cryptoblades_address, ['reforgeWeaponWithDustFee()(int128)'],
-                               [['reforge_weapon_with_dust_fee', None]]))
-        calls_list.append(Call(self.cb.cryptoblades_address, ['burnWeaponFee()(int128)'],
-                               [['burn_weapon_fee', None]]))
-        calls_list.append(Call(self.cb.weapons_address, ['burnPointMultiplier()(uint256)'],
-                               [['weapon_burn_point_multiplier', None]]))
-        calls_list.append(Call(self.cb.weapons_address, ['totalSupply()(uint256)'],
-                               [['weapon_total_supply', None]]))
-        calls_list.append(Call(self.cb.characters_address, ['totalSupply()(uint256)'],
-                               [['character_total_supply', None]]))
-        calls_list.append(Call(self.cb.shields_address, ['totalSupply()(uint256)'],
-                               [['shield_total_supply', None]]))
-        calls_list.append(Call(self.cb.skill_address, ['balanceOf(address)(uint256)', self.cb.cryptoblades_address],
-                               [['reward_pool_skill', self.cb.ether]]))
-        calls_list.append(Call(self.cb.skill_address, ['balanceOf(address)(uint256)', self.cb.bridge_address],
-                               [['bridge_pool_skill', self.cb.ether]]))
-        calls_list.append(Call(self.cb.treasury_address,
-                               ['getProjectMultiplier(uint256)(uint256)', self.cb.treasury_skill_id],
-                               [['treasury_skill_multiplier', self.cb.ether]]))
-        calls_list.append(Call(self.cb.treasury_address,
-                               ['getRemainingPartnerTokenSupply(uint256)(uint256)', self.cb.treasury_skill_id],
-                               [['treasury_skill_remaining_supply', self.cb.ether]]))
-        if self.network == 'bsc':
-            calls_list.append(Call(self.cb.king_address, ['balanceOf(address)(uint256)', self.cb.king_tax_address],
-                                   [['tax_pool_king', self.cb.ether]]))
+    def call_groups(self):
+        # not in build_calls, the Multicall address needs the chain id and the node may be down at startup
+        if self.calls_groups is not None:
+            return self.calls_groups
+        calls_groups = {group: [] for group in CALL_CADENCES}
+        groups = {metric: group for group, metrics in CALL_GROUPS.items() for metric in metrics}
+        # getEthBalance lives on the Multicall contract itself
+        addresses = {'multicall': Multicall([], _w3=self.cb.w3).multicall_address}
+        for metric, documentation, contract, signature, args, converter, networks in CALLS:
+            if networks is not None and self.network not in networks:
+                continue
+            address = addresses[contract] if contract in addresses else getattr(self.cb, f'{contract}_address')
+            args = [getattr(self.cb, arg) if isinstance(arg, str) else arg for arg in args]
+            handler = self.handler(self.cb.ether if converter == 'ether' else None)
+            calls_groups[groups.get(metric, 'block')].append(Call(address, [signature, *args], [[metric, handler]]))
+        calls_groups['block'].append(Call(self.cb.raid_address,
+                                          ['getRaidData()(uint256,uint256,uint256,uint256,uint256,uint8,'
+                                           'uint8,uint256,uint64,uint64,uint64)'],
+                                          [[metric, self.handler(self.cb.ether if converter == 'ether' else None)]
+                                           for metric, _, converter in RAID_DATA]))
+        self.calls_groups = calls_groups
+        return self.calls_groups
 
-        # calls process
+    def handler(self, converter):
+        # without require_success the handlers get (success, value), failed reads stay None
+        if converter is None or self.require_success:
+            return converter
+        return lambda success, value: converter(value) if success and value is not None else None
+
+    def calls_for(self, block):
+        # groups are read on their cadence, and all of them on the first block
+        calls = []
+        for group, group_calls in self.call_groups().items():
+            if group not in self.calls_read or block % self.calls_cadences[group] == 0:
+                self.calls_read.add(group)
+                calls += group_calls
+        return calls
 
-        raid_data = self.cb.get_raid_data(block=last_block)
-        deployer_wallet_balance = self.cb.ether(self.cb.get_wallet_balance(self.cb.deployer_address))
-        tokens_wallet_balance = self.cb.ether(self.cb.get_wallet_balance(self.cb.tokens_address))
-        raid_bot_wallet_balance = self.cb.ether(self.cb.get_wallet_balance(self.cb.raid_bot_address))
-        bridge_bot_wallet_balance = self.cb.ether(self.cb.get_wallet_balance(self.cb.bridge_bot_address))
-        pvp_bot_wallet_balance = self.cb.ether(self.cb.get_wallet_balance(self.cb.pvp_bot_address))
-        calls_multi = Multicall(calls_list, _w3=self.cb.w3, block_id=last_block)()
-
-        # calls define
-
-        calls_usd_list.append(Call(self.cb.cryptoblades_address,
-                                   ['usdToSkill(int128)(uint256)', calls_multi['mint_character_fee']],
-                                   [['mint_character_fee_usd', self.cb.ether]]))
-        calls_usd_list.append(Call(self.cb.cryptoblades_address,
-                                   ['usdToSkill(int128)(uint256)', calls_multi['mint_character_fee_dynamic']],
-                                   [['mint_character_fee_dynamic_usd', self.cb.ether]]))
-        calls_usd_list.append(Call(self.cb.cryptoblades_address,
-                                   ['usdToSkill(int128)(uint256)', calls_multi['mint_weapon_fee']],
-                                   [['mint_weapon_fee_usd', self.cb.ether]]))
-        calls_usd_list.append(Call(self.cb.cryptoblades_address,
-                                   ['usdToSkill(int128)(uint256)', calls_multi['mint_weapon_fee_dynamic']],
-                                   [['mint_weapon_fee_dynamic_usd', self.cb.ether]]))
-        calls_usd_list.append(Call(self.cb.cryptoblades_address,
-                                   ['usdToSkill(int128)(uint256)', calls_multi['reforge_weapon_fee']],
-                                   [['reforge_weapon_fee_usd', self.cb.ether]]))
-        calls_usd_list.append(Call(self.cb.cryptoblades_address,
-                                   ['usdToSkill(int128)(uint256)', calls_multi['reforge_weapon_with_dust_fee']],
-                                   [['reforge_weapon_with_dust_fee_usd', self.cb.ether]]))
-        calls_usd_list.append(Call(self.cb.cryptoblades_address,
-                                   ['usdToSkill(int128)(uint256)', calls_multi['burn_weapon_fee']],
-                                   [['burn_weapon_fee_usd', self.cb.ether]]))
+    def calls_price(self, price_oracle):
+        # the oracle in use at the block, and the price of the oracle this request expects
+        calls = [Call(self.cb.cryptoblades_address, ['priceOracleSkillPerUsd()(address)'], [['price_oracle', None]])]
+        if price_oracle is not None:
+            calls.append(Call(price_oracle, ['currentPrice()(uint256)'], [['skill_per_usd', None]]))
+        return calls
+
+    def calls(self, last_block):
+        t1_start = time.perf_counter()
 
         # calls process
 
-        calls_multi_usd = Multicall(calls_usd_list, _w3=self.cb.w3, block_id=last_block)()
-
-        # set metrics
-
-        block_number_metric.labels(self.network).set(last_block)
-        var_hourly_income_metric.labels(self.network).set(calls_multi['var_hourly_income'])
-        var_hourly_fights_metric.labels(self.network).set(calls_multi['var_hourly_fights'])
-        var_hourly_power_sum_metric.labels(self.network).set(calls_multi['var_hourly_power_sum'])
-        var_hourly_power_average_metric.labels(self.network).set(calls_multi['var_hourly_power_average'])
-        var_hourly_pay_per_fight_metric.labels(self.network).set(calls_multi['var_hourly_pay_per_fight'])
-        var_hourly_timestamp_metric.labels(self.network).set(calls_multi['var_hourly_timestamp'])
-        var_daily_max_claim_metric.labels(self.network).set(calls_multi['var_daily_max_claim'])
-        var_claim_deposit_amount_metric.labels(self.network).set(calls_multi['var_claim_deposit_amount'])
-        var_param_payout_income_percent_metric.labels(self.network).set(calls_multi['var_param_payout_income_percent'])
-        var_param_daily_claim_fights_limit_metric.labels(self.network).set(calls_multi['var_param_daily_claim_fights_limit'])
-        var_param_daily_claim_deposit_percent_metric.labels(self.network).set(calls_multi['var_param_daily_claim_deposit_percent'])
-        var_param_max_fight_payout_metric.labels(self.network).set(calls_multi['var_param_max_fight_payout'])
-        var_hourly_distribution_metric.labels(self.network).set(calls_multi['var_hourly_distribution'])
-        var_unclaimed_skill_metric.labels(self.network).set(calls_multi['var_unclaimed_skill'])
-        var_hourly_max_power_average_metric.labels(self.network).set(calls_multi['var_hourly_max_power_average'])
-        var_param_hourly_max_power_percent_metric.labels(self.network).set(calls_multi['var_param_hourly_max_power_percent'])
-        var_param_significant_hour_fights_metric.labels(self.network).set(calls_multi['var_param_significant_hour_fights'])
-        var_param_hourly_pay_allowance_metric.labels(self.network).set(calls_multi['var_param_hourly_pay_allowance'])
-        var_mint_weapon_fee_decrease_speed_metric.labels(self.network).set(calls_multi['var_mint_weapon_fee_decrease_speed'])
-        var_mint_character_fee_decrease_speed_metric.labels(self.network).set(calls_multi['var_mint_character_fee_decrease_speed'])
-        var_weapon_fee_increase_metric.labels(self.network).set(calls_multi['var_weapon_fee_increase'])
-        var_character_fee_increase_metric.labels(self.network).set(calls_multi['var_character_fee_increase'])
-        var_min_weapon_fee_metric.labels(self.network).set(calls_multi['var_min_weapon_fee'])
-        var_min_character_fee_metric.labels(self.network).set(calls_multi['var_min_character_fee'])
-        var_weapon_mint_timestamp_metric.labels(self.network).set(calls_multi['var_weapon_mint_timestamp'])
-        var_character_mint_timestamp_metric.labels(self.network).set(calls_multi['var_character_mint_timestamp'])
-        fight_xp_gain_metric.labels(self.network).set(calls_multi['fight_xp_gain'])
-        mint_character_fee_usd_metric.labels(self.network).set(calls_multi_usd['mint_character_fee_usd'])
-        mint_character_fee_dynamic_usd_metric.labels(self.network).set(calls_multi_usd['mint_character_fee_dynamic_usd'])
-        mint_weapon_fee_usd_metric.labels(self.network).set(calls_multi_usd['mint_weapon_fee_usd'])
-        mint_weapon_fee_dynamic_usd_metric.labels(self.network).set(calls_multi_usd['mint_weapon_fee_dynamic_usd'])
-        reforge_weapon_fee_usd_metric.labels(self.network).set(calls_multi_usd['reforge_weapon_fee_usd'])
-        reforge_weapon_with_dust_fee_usd_metric.labels(self.network).set(calls_multi_usd['reforge_weapon_with_dust_fee_usd'])
-        burn_weapon_fee_usd_metric.labels(self.network).set(calls_multi_usd['burn_weapon_fee_usd'])
-        weapon_burn_point_multiplier_metric.labels(self.network).set(calls_multi['weapon_burn_point_multiplier'])
-        weapon_total_supply_metric.labels(self.network).set(calls_multi['weapon_total_supply'])
-        character_total_supply_metric.labels(self.network).set(calls_multi['character_total_supply'])
-        shield_total_supply_metric.labels(self.network).set(calls_multi['shield_total_supply'])
-        raid_index_metric.labels(self.network).set(raid_data[0])
-        raid_end_time_metric.labels(self.network).set(raid_data[1])
-        raid_raider_count_metric.labels(self.network).set(raid_data[2])
-        raid_player_power_metric.labels(self.network).set(raid_data[3])
-        raid_boss_power_metric.labels(self.network).set(raid_data[4])
-        raid_trait_metric.labels(self.network).set(raid_data[5])
-        raid_status_metric.labels(self.network).set(raid_data[6])
-        raid_join_skill_metric.labels(self.network).set(self.cb.ether(raid_data[7]))
-        raid_stamina_metric.labels(self.network).set(raid_data[8])
-        raid_durability_metric.labels(self.network).set(raid_data[9])
-        raid_xp_metric.labels(self.network).set(raid_data[10])
-        reward_pool_skill_metric.labels(self.network).set(calls_multi['reward_pool_skill'])
-        if self.network != 'skale' and self.network != 'aurora':
-            bridge_pool_skill_metric.labels(self.network).set(calls_multi['bridge_pool_skill'])
-        deployer_wallet_balance_metric.labels(self.network).set(deployer_wallet_balance)
-        tokens_wallet_balance_metric.labels(self.network).set(tokens_wallet_balance)
-        raid_bot_wallet_balance_metric.labels(self.network).set(raid_bot_wallet_balance)
-        bridge_bot_wallet_balance_metric.labels(self.network).set(bridge_bot_wallet_balance)
-        pvp_bot_wallet_balance_metric.labels(self.network).set(pvp_bot_wallet_balance)
-        treasury_skill_remaining_supply_metric.labels(self.network).set(calls_multi['treasury_skill_remaining_supply'])
-        if calls_multi['treasury_skill_remaining_supply'] > 0:
-            treasury_skill_multiplier_metric.labels(self.network).set(calls_multi['treasury_skill_multiplier'])
-        if self.network == 'bsc':
-            tax_pool_king_metric.labels(self.network).set(calls_multi['tax_pool_king'])
+        price_oracle = self.price_oracle
+        calls_multi = Multicall(self.calls_for(last_block) + self.calls_price(price_oracle), _w3=self.cb.w3,
+                                block_id=last_block, require_success=self.require_success)()
+        if not self.convert_usd(calls_multi, price_oracle):
+            calls_multi.update(Multicall(self.calls_usd_list(calls_multi), _w3=self.cb.w3, block_id=last_block,
+                                         require_success=self.require_success)())
+        self.set_calls(last_block, calls_multi)
 
         # pvp
 
         # if self.network != 'avax':
         #     pvp_matchable_player_count = Gauge('cb_pvp_matchable_player_count', 'getMatchablePlayerCount',
-        #                                        ['network', 'pvp_tier'], registry=calls_registry)
+        #                                        ['network', 'pvp_tier'], registry=self.calls_registry)
         #     pvp_ranking_pool = Gauge('cb_pvp_ranking_pool', 'rankingsPoolByTier',
-        #                              ['network', 'pvp_tier'], registry=calls_registry)
+        #                              ['network', 'pvp_tier'], registry=self.calls_registry)
         #     pvp_queue = Gauge('cb_pvp_queue', 'getDuelQueue',
-        #                       ['network'], registry=calls_registry)
+        #                       ['network'], registry=self.calls_registry)
         #     pvp_tax_coffer = Gauge('cb_pvp_tax_coffer', 'gameCofferTaxDue',
-        #                            ['network'], registry=calls_registry)
+        #                            ['network'], registry=self.calls_registry)
         #     pvp_tiers = range(11)
         #     pvp_call_list = []
         #     for tier in pvp_tiers:
@@ -647,18 +272,483 @@ class Metrics:
 
         t1_stop = time.perf_counter()
         print(f"{self.network} {last_block} MultiCall {(t1_stop - t1_start):.5f}")
-        return calls_registry
+        return self.calls_registry
+
+    def convert_usd(self, calls_multi, price_oracle):
+        # price_oracle is the oracle the request was built with, other requests in flight may expect another one
+        block_oracle = calls_multi.pop('price_oracle')
+        skill_per_usd = calls_multi.pop('skill_per_usd', None)
+        if block_oracle is not None:
+            block_oracle = self.cb.w3.toChecksumAddress(block_oracle)
+        if block_oracle != price_oracle or skill_per_usd is None:
+            # oracle unknown yet or replaced, skill_per_usd is missing or stale for this block
+            self.price_oracle = block_oracle
+            return False
+        # same math as usdToSkill(int128)
+        for metric in self.calls_usd:
+            if calls_multi.get(metric) is not None:
+                calls_multi[metric] = self.cb.ether(mulu(calls_multi[metric], skill_per_usd))
+        return True
+
+    def calls_usd_list(self, calls_multi):
+        return [Call(self.cb.cryptoblades_address, ['usdToSkill(int128)(uint256)', calls_multi[metric]],
+                     [[metric, self.handler(self.cb.ether)]])
+                for metric in self.calls_usd if calls_multi.get(metric) is not None]
+
+    def set_calls(self, last_block, calls_multi):
+        calls_multi['cb_block_number'] = last_block
+        for metric, value in calls_multi.items():
+            if value is None:
+                # the contract or function did not exist yet at this block
+                continue
+            self.calls_gauges[metric].labels(self.network).set(value)
+            if self.calls_last.get(metric) != value:
+                self.calls_last[metric] = value
+                self.calls_changed.add(metric)
+        remaining_supply = calls_multi.get('cb_treasury_skill_remaining_supply')
+        if remaining_supply is not None and remaining_supply <= 0:
+            # read with the supply every block, and pushed again as soon as the supply is back
+            self.calls_gauges['cb_treasury_skill_multiplier'].clear()
+            self.calls_last.pop('cb_treasury_skill_multiplier', None)
+
+    def push_calls(self, timestamp):
+        if timestamp - self.calls_full_time >= self.calls_full_refresh:
+            # keeps every series inside the VictoriaMetrics staleness window
+            self.calls_full_time = timestamp
+            self.vm.add(self.calls_registry, timestamp)
+        else:
+            self.vm.add(self.calls_registry, timestamp, self.calls_changed)
+        self.calls_changed = set()
+
+    async def fetch_calls(self, block):
+        price_oracle = self.price_oracle
+        calls_multi = await Multicall(self.calls_for(block) + self.calls_price(price_oracle), _w3=self.cb.w3,
+                                      block_id=block, require_success=self.require_success).coroutine()
+        if not self.convert_usd(calls_multi, price_oracle):
+            calls_usd = Multicall(self.calls_usd_list(calls_multi), _w3=self.cb.w3, block_id=block,
+                                  require_success=self.require_success)
+            calls_multi.update(await calls_usd.coroutine())
+        return calls_multi
+
+
+class Metrics(StateCalls):
+    def __init__(self, network, path=None, archive=False):
+        super().__init__(network, path, archive)
+        self.checkpoint = MongoCheckpoint(self.db.cb_metrics_last_block, self.network)
+        self.catch_up_distance = 15
+        self.catch_up_window = 2000
+        self.window = self.catch_up_window
+        self.heartbeat = None
+        self.heads = Heads(self.network, self.cb)
+        # 'series' labels every event with its ids, 'aggregated' counts them and keeps the rows in Mongo
+        self.events_mode = self.cb.config.get('events_mode', 'series')
+        if self.events_mode == 'aggregated':
+            self.events_counter_registry = CollectorRegistry()
+            self.events_counter = Counter('cb_events', 'Game events',
+                                          ['network', 'event', 'tier', 'stars', 'weapon_type'],
+                                          registry=self.events_counter_registry)
+            self.event_store = EventStore(self.db[f'cb_{network}_events'])
+        # columnar copy of every decoded event, see archive.py
+        self.event_archive = None
+        if self.cb.config.get('event_archive'):
+            self.event_archive = EventArchive(self.cb.config['event_archive'], network,
+                                              self.cb.config.get('event_archive_segment_blocks', 1000000))
+        self.event_handlers = {}
+        for contract, name, metric, title, lookup, labels in [
+            (self.cb.quests_contract, 'QuestComplete', 'cb_quest_complete', 'QuestComplete',
+             self.quest_lookup, self.quest_labels),
+            (self.cb.quests_contract, 'QuestSkipped', 'cb_quest_skipped', 'QuestSkipped',
+             self.quest_lookup, self.quest_labels),
+            (self.cb.quests_contract, 'QuestAssigned', 'cb_quest_assigned', 'QuestAssigned',
+             self.quest_lookup, self.quest_labels),
+            (self.cb.quests_contract, 'WeeklyRewardClaimed', 'cb_quest_weekly_reward_claimed', 'WeeklyRewardClaimed',
+             None, self.weekly_reward_labels),
+            (self.cb.pvp_contract, 'DuelFinished', 'cb_pvp_duel_finished', 'DuelFinished',
+             None, self.duel_finished_labels),
+            (self.cb.characters_contract, 'NewCharacter', 'cb_character_minted', 'NewCharacter',
+             None, self.character_minted_labels),
+            (self.cb.characters_contract, 'Burned', 'cb_character_burned', 'Burned (character)',
+             self.character_burned_lookup, self.character_burned_labels),
+            (self.cb.weapons_contract, 'NewWeapon', 'cb_weapon_minted', 'NewWeapon',
+             self.weapon_minted_lookup, self.weapon_minted_labels),
+            (self.cb.weapons_contract, 'Burned', 'cb_weapon_burned', 'Burned (weapon)',
+             self.weapon_burned_lookup, self.weapon_burned_labels),
+            (self.cb.shields_contract, 'NewShield', 'cb_shield_minted', 'NewShield',
+             self.shield_minted_lookup, self.shield_minted_labels),
+            (self.cb.shields_contract, 'Burned', 'cb_shield_burned', 'Burned (shield)',
+             self.shield_burned_lookup, self.shield_burned_labels),
+        ]:
+            event = contract.events[name]()
+            topic = event_abi_to_log_topic(event._get_event_abi())
+            self.event_handlers[(contract.address, topic)] = (event, metric, title, lookup, labels)
+
+    @backoff.on_exception(backoff.constant, Exception, interval=5, jitter=None)
+    def block_filter(self):
+        last_block = self.checkpoint.load(self.heads.latest())
+        while True:
+            self.beat()
+            latest_block = self.heads.latest()
+            if latest_block - last_block > self.catch_up_distance:
+                last_block = self.catch_up(last_block, latest_block - self.catch_up_distance)
+                self.commit(last_block)
+                continue
+            if latest_block - 2 >= last_block:
+                block_info = self.cb.w3.eth.get_block(last_block)
+                timestamp = block_info['timestamp']
+                events_data = self.events(last_block, self.get_logs(last_block, last_block))
+                if events_data:
+                    self.push_events(events_data, timestamp)
+                self.calls(last_block)
+                self.push_calls(timestamp)
+                last_block += 1
+                self.commit(last_block)
+                continue
+            self.heads.wait()
+
+    def beat(self):
+        if self.heartbeat is not None:
+            self.heartbeat.value = time.time()
+
+    def catch_up(self, from_block, to_block):
+        to_block = min(to_block, from_block + self.window - 1)
+        try:
+            logs = self.get_logs(from_block, to_block)
+        except (ValueError, requests.exceptions.Timeout, requests.exceptions.HTTPError,
+                requests.exceptions.ConnectionError) as err:
+            # too many results or too wide range, retry with a smaller window; some providers answer
+            # with an HTTP 400/413/503 or drop the connection on a huge response instead of an RPC error
+            if self.window == 1:
+                raise
+            self.window = max(self.window // 2, 1)
+            print(f'{self.network} {from_block}-{to_block} CatchUp window {self.window} {err}')
+            return from_block
+        blocks = {}
+        for log in logs:
+            blocks.setdefault(log['blockNumber'], []).append(log)
+        for block in sorted(blocks):
+            timestamp = self.cb.w3.eth.get_block(block)['timestamp']
+            events_data = self.events(block, blocks[block])
+            if events_data:
+                self.push_events(events_data, timestamp)
+        print(f'{self.network} {from_block}-{to_block} CatchUp {len(logs)} logs')
+        self.window = min(self.window * 2, self.catch_up_window)
+        return to_block + 1
+
+    def get_logs(self, from_block, to_block):
+        return self.cb.w3.eth.get_logs(self.logs_filter(from_block, to_block))
+
+    def logs_filter(self, from_block, to_block):
+        contracts = [self.cb.quests_address,
+                     self.cb.pvp_address,
+                     self.cb.characters_address,
+                     self.cb.weapons_address,
+                     self.cb.shields_address]
+        if self.network == 'avax':
+            contracts.remove(self.cb.pvp_address)
+        return {'fromBlock': from_block, 'toBlock': to_block, 'address': contracts}
+
+    def events(self, last_block, logs):
+        if logs:
+            events_registry = CollectorRegistry()
+            metrics = {
+                # quests
+                'cb_quest_complete': Gauge('cb_quest_complete', 'QuestComplete',
+                                           ['network', 'tier', 'quest', 'character',
+                                            'user', 'block', 'hash'],
+                                           registry=events_registry),
+                'cb_quest_skipped': Gauge('cb_quest_skipped', 'QuestSkipped',
+                                          ['network', 'tier', 'quest', 'character',
+                                           'user', 'block', 'hash'],
+                                          registry=events_registry),
+                'cb_quest_assigned': Gauge('cb_quest_assigned', 'QuestAssigned',
+                                           ['network', 'tier', 'quest', 'character',
+                                            'user', 'block', 'hash'],
+                                           registry=events_registry),
+                'cb_quest_weekly_reward_claimed': Gauge('cb_quest_weekly_reward_claimed', 'WeeklyRewardClaimed',
+                                                        ['network', 'user', 'block', 'hash'],
+                                                        registry=events_registry),
+                # pvp
+                'cb_pvp_duel_finished': Gauge('cb_pvp_duel_finished', 'DuelFinished',
+                                              ['network', 'attacker', 'defender',
+                                               'attacker_roll', 'defender_roll',
+                                               'attacker_won', 'bonus_rank', 'block', 'hash'],
+                                              registry=events_registry),
+                # characters
+                'cb_character_minted': Gauge('cb_character_minted', 'NewCharacter',
+                                             ['network', 'character',
+                                              'user', 'block', 'hash'],
+                                             registry=events_registry),
+                'cb_character_burned': Gauge('cb_character_burned', 'Burned',
+                                             ['network', 'character', 'character_level',
+                                              'user', 'block', 'hash'],
+                                             registry=events_registry),
+                # weapons
+                'cb_weapon_minted': Gauge('cb_weapon_minted', 'NewWeapon',
+                                          ['network', 'weapon', 'weapon_stars', 'weapon_type',
+                                           'user', 'block', 'hash'],
+                                          registry=events_registry),
+                'cb_weapon_burned': Gauge('cb_weapon_burned', 'Burned',
+                                          ['network', 'weapon', 'weapon_stars',
+                                           'user', 'block', 'hash'],
+                                          registry=events_registry),
+                # shields
+                'cb_shield_minted': Gauge('cb_shield_minted', 'NewShield',
+                                          ['network', 'shield', 'shield_stars',
+                                           'user', 'block', 'hash'],
+                                          registry=events_registry),
+                'cb_shield_burned': Gauge('cb_shield_burned', 'Burned',
+                                          ['network', 'shield', 'shield_stars',
+                                           'user', 'block', 'hash'],
+                                          registry=events_registry),
+            }
+            decoded = []
+            lookups = {}
+            for log in logs:
+                try:
+                    event, metric, title, lookup, labels = self.event_handlers[(log['address'], bytes(log['topics'][0]))]
+                except (KeyError, IndexError):
+                    continue
+                event = event.processLog(log)
+                decoded.append((event, metric, title, labels))
+                call = lookup(event) if lookup is not None else None
+                if call is not None:
+                    lookups[call.returns[-1][0]] = call
+            # enrichment
+            results = {}
+            if lookups:
+                results = Multicall(list(lookups.values()), _w3=self.cb.w3, block_id=last_block)()
+                for name, value in results.items():
+                    if name.startswith('quest_'):
+                        self.cb.cache_quest(int(name.split('quest_')[1]), value)
+            # quest labels need the sender of each transaction, ask for all of them at once
+            # once per transaction, one transaction may emit several quest events
+            txn_hashes = {event['transactionHash'] for event, _, _, labels in decoded if labels == self.quest_labels}
+            with self.cb.batch() as batch:
+                pending = {txn_hash: batch.request('eth_getTransactionByHash', [txn_hash.hex()])
+                           for txn_hash in txn_hashes}
+            senders = {txn_hash: to_checksum_address(result.value['from'])
+                       for txn_hash, result in pending.items() if result.value is not None}
+            rows = []
+            for event, metric, title, labels in decoded:
+                print(self.network, last_block, title)
+                values = labels(event, last_block, senders, results)
+                if self.events_mode != 'aggregated':
+                    metrics[metric].labels(*values).inc()
+                rows.append({**dict(zip(metrics[metric]._labelnames, values)),
+                             'event': metric, 'block': last_block, 'log_index': event['logIndex']})
+            if self.event_archive is not None:
+                self.event_archive.append(rows)
+            if self.events_mode != 'aggregated':
+                return events_registry
+            # per event rows go to the event store, the TSDB only gets counters of bounded cardinality;
+            # events of a replayed block are already stored and must not be counted twice
+            inserted = self.event_store.append(rows)
+            for row in inserted:
+                stars = row.get('weapon_stars', row.get('shield_stars', ''))
+                self.events_counter.labels(self.network, row['event'], row.get('tier', ''), stars,
+                                           row.get('weapon_type', '')).inc()
+            return self.events_counter_registry if inserted else None
+
+    def get_sender(self, txn_hash, senders):
+        if txn_hash not in senders:
+            senders[txn_hash] = self.cb.w3.eth.get_transaction(txn_hash)['from']
+        return senders[txn_hash]
+
+    def quest_lookup(self, event):
+        quest = event['args']['questID']
+        if self.cb.get_cached_quest(quest) is not None:
+            return None
+        return Call(self.cb.quests_address, ['quests(uint256)((uint256,uint8,uint8,uint256,uint256,address,'
+                                             'uint8,uint256,uint256,address,uint256))', quest],
+                    [[f'quest_{quest}', None]])
+
+    def character_burned_lookup(self, event):
+        character = event['args']['id']
+        return Call(self.cb.characters_address, ['getLevel(uint256)(uint8)', character],
+                    [[f'character_level_{character}', None]])
+
+    def weapon_minted_lookup(self, event):
+        weapon = event['args']['weapon']
+        return Call(self.cb.weapons_address, ['getStars(uint256)(uint8)', weapon],
+                    [[f'weapon_stars_{weapon}', None]])
+
+    def weapon_burned_lookup(self, event):
+        weapon = event['args']['burned']
+        return Call(self.cb.weapons_address, ['getStars(uint256)(uint8)', weapon],
+                    [[f'weapon_stars_{weapon}', None]])
+
+    def shield_minted_lookup(self, event):
+        shield = event['args']['shield']
+        return Call(self.cb.shields_address, ['getStars(uint256)(uint8)', shield],
+                    [[f'shield_stars_{shield}', None]])
+
+    def shield_burned_lookup(self, event):
+        shield = event['args']['shield']
+        return Call(self.cb.shields_address, ['getStars(uint256)(uint8)', shield],
+                    [[f'shield_stars_{shield}', None]])
+
+    def quest_labels(self, event, block, senders, results):
+        quest = event['args']['questID']
+        character = event['args']['characterID']
+        tier = (results.get(f'quest_{quest}') or self.cb.get_quests(quest, block=block))[1]
+        user = self.get_sender(event['transactionHash'], senders)
+        return [self.network, tier, quest, character, user, block, event['transactionHash'].hex()]
+
+    def weekly_reward_labels(self, event, block, senders, results):
+        user = event['args']['user']
+        return [self.network, user, block, event['transactionHash'].hex()]
+
+    def duel_finished_labels(self, event, block, senders, results):
+        return [self.network, event['args']['attacker'], event['args']['defender'],
+                event['args']['attackerRoll'], event['args']['defenderRoll'],
+                event['args']['attackerWon'], event['args']['bonusRank'], block, event['transactionHash'].hex()]
+
+    def character_minted_labels(self, event, block, senders, results):
+        character = event['args']['character']
+        user = event['args']['minter']
+        return [self.network, character, user, block, event['transactionHash'].hex()]
+
+    def character_burned_labels(self, event, block, senders, results):
+        character = event['args']['id']
+        character_level = results[f'character_level_{character}']
+        user = event['args']['owner']
+        return [self.network, character, character_level, user, block, event['transactionHash'].hex()]
+
+    def weapon_minted_labels(self, event, block, senders, results):
+        weapon = event['args']['weapon']
+        weapon_stars = results[f'weapon_stars_{weapon}']
+        weapon_type = event['args']['weaponType']
+        user = event['args']['minter']
+        return [self.network, weapon, weapon_stars, weapon_type, user, block, event['transactionHash'].hex()]
+
+    def weapon_burned_labels(self, event, block, senders, results):
+        weapon = event['args']['burned']
+        weapon_stars = results[f'weapon_stars_{weapon}']
+        user = event['args']['owner']
+        return [self.network, weapon, weapon_stars, user, block, event['transactionHash'].hex()]
+
+    def shield_minted_labels(self, event, block, senders, results):
+        shield = event['args']['shield']
+        shield_stars = results[f'shield_stars_{shield}']
+        user = event['args']['minter']
+        return [self.network, shield, shield_stars, user, block, event['transactionHash'].hex()]
+
+    def shield_burned_labels(self, event, block, senders, results):
+        shield = event['args']['shield']
+        shield_stars = results[f'shield_stars_{shield}']
+        user = event['args']['burner']
+        return [self.network, shield, shield_stars, user, block, event['transactionHash'].hex()]
+
+    def push_events(self, registry, timestamp):
+        if self.events_mode == 'aggregated':
+            # without the _created samples of the counter
+            self.vm.add(registry, timestamp, {'cb_events_total'})
+        else:
+            self.vm.add(registry, timestamp)
+
+    def commit(self, last_block):
+        # the cursor is only written once the samples before it are in VictoriaMetrics
+        self.checkpoint.advance(last_block)
+        if self.checkpoint.due():
+            self.vm.flush()
+            self.checkpoint.commit()
+
+
+class AsyncMetrics(Metrics):
+    def __init__(self, network, path=None, archive=False):
+        super().__init__(network, path, archive)
+        self.aw3 = self.cb.get_async_w3()
+
+    @backoff.on_exception(backoff.constant, Exception, interval=5, jitter=None)
+    def block_filter(self):
+        asyncio.run(self.async_block_filter())
+
+    async def async_block_filter(self):
+        last_block = await asyncio.to_thread(self.checkpoint.load, await asyncio.to_thread(self.heads.latest))
+        prefetch = {}
+        while True:
+            self.beat()
+            latest_block = await asyncio.to_thread(self.heads.latest)
+            if latest_block - last_block > self.catch_up_distance:
+                for task in prefetch.values():
+                    task.cancel()
+                prefetch.clear()
+                last_block = await asyncio.to_thread(self.catch_up, last_block, latest_block - self.catch_up_distance)
+                await asyncio.to_thread(self.commit, last_block)
+                continue
+            if latest_block - 2 >= last_block:
+                # fetch block N + 1 while block N is decoded and pushed
+                for block in range(last_block, min(last_block + 2, latest_block - 1)):
+                    if block not in prefetch:
+                        prefetch[block] = asyncio.create_task(self.fetch(block))
+                timestamp, logs, calls_multi = await prefetch.pop(last_block)
+                await asyncio.to_thread(self.process, last_block, timestamp, logs, calls_multi)
+                last_block += 1
+                continue
+            await asyncio.to_thread(self.heads.wait)
+
+    async def fetch(self, block):
+        block_info, logs, calls_multi = await asyncio.gather(
+            self.aw3.eth.get_block(block),
+            self.aw3.eth.get_logs(self.logs_filter(block, block)),
+            self.fetch_calls(block))
+        return block_info['timestamp'], logs, calls_multi
+
+    def process(self, last_block, timestamp, logs, calls_multi):
+        events_data = self.events(last_block, logs)
+        if events_data:
+            self.push_events(events_data, timestamp)
+        self.set_calls(last_block, calls_multi)
+        self.push_calls(timestamp)
+        self.commit(last_block + 1)
+
+
+class Backfill(StateCalls):
+    # calls added to the contracts later revert on older blocks
+    require_success = False
+
+    def __init__(self, network, from_block, to_block, stride=100, concurrency=8):
+        # only the state gauges, no heads, event handlers, event stores or block cursor
+        super().__init__(network, archive=True)
+        self.aw3 = self.cb.get_async_w3()
+        self.from_block = from_block
+        self.to_block = to_block
+        self.stride = stride
+        self.concurrency = concurrency
+        # a job is resumed when started again with the same range and stride
+        self.backfill_checkpoint = MongoCheckpoint(self.db.cb_metrics_backfill,
+                                                   f'{network}:{from_block}:{to_block}:{stride}')
+
+    def calls_for(self, block):
+        # sampled blocks rarely line up with the cadences, read everything
+        return [call for group_calls in self.call_groups().values() for call in group_calls]
+
+    def run(self):
+        asyncio.run(self.async_run())
 
-    def push_to_vm(self, registry, timestamp):
-        url = f'{self.vm}?timestamp={timestamp * 1000}&extra_label=job={self.job}&extra_label=instance={self.instance}'
-        data = generate_latest(registry)
-        default_handler(url=url, method='POST', timeout=30, headers=[("Content-Type", CONTENT_TYPE_LATEST)], data=data)()
+    async def async_run(self):
+        block = await asyncio.to_thread(self.backfill_checkpoint.load, self.from_block)
+        while block <= self.to_block:
+            blocks = list(range(block, min(block + self.stride * self.concurrency, self.to_block + 1), self.stride))
+            results = await asyncio.gather(*(asyncio.gather(self.aw3.eth.get_block(b), self.fetch_calls(b))
+                                             for b in blocks))
+            for b, (block_info, calls_multi) in zip(blocks, results):
+                self.set_calls(b, calls_multi)
+                self.push_calls(block_info['timestamp'])
+            # the samples are in VictoriaMetrics before the job moves on
+            await asyncio.to_thread(self.vm.flush)
+            block = blocks[-1] + self.stride
+            self.backfill_checkpoint.advance(block)
+            await asyncio.to_thread(self.backfill_checkpoint.commit)
+            print(f'{self.network} backfill {blocks[-1]}/{self.to_block}')
 
 
-def run_threads():
+def run_threads(networks, metrics_class=Metrics, heartbeats=None):
     threads = []
-    for network in network_list:
-        metrics = Metrics(network)
+    for network in networks:
+        metrics = metrics_class(network)
+        if heartbeats is not None:
+            metrics.heartbeat = heartbeats[network]
         t = threading.Thread(target=metrics.block_filter, daemon=True)
         t.start()
         threads.append(t)
@@ -669,4 +759,11 @@ def run_threads():
 
 if __name__ == '__main__':
     network_list = ['bsc', 'heco', 'oec', 'poly', 'avax', 'skale']
-    run_threads()
+    metrics_class = AsyncMetrics if 'async' in sys.argv[1:] else Metrics
+    if sys.argv[1:2] == ['backfill']:
+        # python metrics.py backfill network from_block to_block [stride] [concurrency]
+        Backfill(sys.argv[2], *map(int, sys.argv[3:7])).run()
+    elif 'processes' in sys.argv[1:]:
+        Supervisor('metrics', run_threads, load_groups('metrics', network_list), args=(metrics_class,)).run()
+    else:
+        run_threads(network_list, metrics_class)
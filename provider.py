@@ -0,0 +1,79 @@
+import requests
+from eth_abi import decode_abi
+from requests.adapters import HTTPAdapter
+from web3 import HTTPProvider
+from web3._utils.abi import get_abi_output_types, map_abi_data
+from web3._utils.normalizers import BASE_RETURN_NORMALIZERS
+
+
+class PooledHTTPProvider(HTTPProvider):
+    def __init__(self, endpoint_uri, pool_size=10, timeout=30):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.timeout = timeout
+        super().__init__(endpoint_uri, request_kwargs={'timeout': timeout}, session=self.session)
+
+    def make_batch_request(self, calls):
+        payload = [{'jsonrpc': '2.0', 'id': i, 'method': method, 'params': params}
+                   for i, (method, params) in enumerate(calls)]
+        response = self.session.post(self.endpoint_uri, json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        responses = response.json()
+        if isinstance(responses, dict):
+            # the node rejected the whole batch
+            raise ValueError(responses.get('error', responses))
+        responses = {item['id']: item for item in responses}
+        return [responses.get(i, {'error': 'missing from batch response'}) for i in range(len(calls))]
+
+
+class BatchResult:
+    def __init__(self, formatter):
+        self.formatter = formatter
+        self.value = None
+
+
+class Batch:
+    def __init__(self, w3, block='latest', batch_size=100):
+        self.w3 = w3
+        self.block = hex(block) if isinstance(block, int) else block
+        self.batch_size = batch_size
+        self.calls = []
+        self.results = []
+
+    def request(self, method, params, formatter=None):
+        result = BatchResult(formatter)
+        self.calls.append((method, params))
+        self.results.append(result)
+        return result
+
+    def call(self, function):
+        # a bound contract function, decoded the same way function.call() does
+        output_types = get_abi_output_types(function.abi)
+
+        def decode(data):
+            output = map_abi_data(BASE_RETURN_NORMALIZERS, output_types,
+                                  decode_abi(output_types, bytes.fromhex(data[2:])))
+            return output[0] if len(output) == 1 else output
+
+        return self.request('eth_call', [{'to': function.address, 'data': function._encode_transaction_data()},
+                                         self.block], decode)
+
+    def execute(self):
+        provider = self.w3.provider
+        for start in range(0, len(self.calls), self.batch_size):
+            calls = self.calls[start:start + self.batch_size]
+            if isinstance(provider, PooledHTTPProvider):
+                responses = provider.make_batch_request(calls)
+            else:
+                # ipc has no batches, a local socket round trip is cheap anyway
+                responses = [provider.make_request(method, params) for method, params in calls]
+            for result, response in zip(self.results[start:start + self.batch_size], responses):
+                if 'error' in response:
+                    raise ValueError(response['error'])
+                value = response['result']
+                result.value = result.formatter(value) if result.formatter is not None and value is not None \
+                    else value
+        self.calls = []
+        self.results = []
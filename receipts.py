@@ -0,0 +1,74 @@
+import requests
+from web3._utils.method_formatters import receipt_formatter
+
+METHOD_NOT_FOUND = -32601
+
+
+def unsupported(error):
+    # only a missing method turns eth_getBlockReceipts off, other errors are a miss for one block
+    if isinstance(error, dict):
+        if error.get('code') == METHOD_NOT_FOUND:
+            return True
+        error = error.get('message', '')
+    error = str(error).lower()
+    return 'method not found' in error or 'not supported' in error or 'does not exist' in error
+
+
+class Receipts:
+    def __init__(self, network, cb, block_receipts_min=3):
+        self.network = network
+        self.cb = cb
+        # below this many receipts a batch is cheaper than the whole block
+        self.block_receipts_min = block_receipts_min
+        # None until the node answers eth_getBlockReceipts once
+        self.block_receipts = None
+        self.block = None
+        self.receipts = {}
+
+    def prefetch(self, block, txn_hashes):
+        self.block = block
+        self.receipts = {}
+        txn_hashes = [txn_hash if isinstance(txn_hash, str) else txn_hash.hex() for txn_hash in txn_hashes]
+        if not txn_hashes:
+            return
+        if len(txn_hashes) >= self.block_receipts_min and self.block_receipts is not False:
+            self.fetch_block(block)
+        missing = [txn_hash for txn_hash in txn_hashes if txn_hash not in self.receipts]
+        if missing:
+            self.fetch_batch(missing)
+
+    def get(self, txn_hash):
+        if not isinstance(txn_hash, str):
+            txn_hash = txn_hash.hex()
+        if txn_hash not in self.receipts:
+            self.receipts[txn_hash] = self.cb.w3.eth.get_transaction_receipt(txn_hash)
+        return self.receipts[txn_hash]
+
+    def fetch_block(self, block):
+        try:
+            response = self.cb.w3.provider.make_request('eth_getBlockReceipts', [hex(block)])
+        except requests.exceptions.RequestException as err:
+            # rate limit or timeout, the batch fills in for this block
+            print(f'{self.network} {block} eth_getBlockReceipts {err}')
+            return
+        if 'error' in response:
+            if unsupported(response['error']):
+                print(f'{self.network} eth_getBlockReceipts unsupported, using batch requests')
+                self.block_receipts = False
+            else:
+                print(f'{self.network} {block} eth_getBlockReceipts {response["error"]}')
+            return
+        if response.get('result') is None:
+            # block not known to this node yet, the batch fills in
+            return
+        self.block_receipts = True
+        for receipt in response['result']:
+            self.receipts[receipt['transactionHash']] = receipt_formatter(receipt)
+
+    def fetch_batch(self, txn_hashes):
+        with self.cb.batch() as batch:
+            pending = {txn_hash: batch.request('eth_getTransactionReceipt', [txn_hash], receipt_formatter)
+                       for txn_hash in txn_hashes}
+        for txn_hash, result in pending.items():
+            if result.value is not None:
+                self.receipts[txn_hash] = result.value
@@ -0,0 +1,100 @@
+import multiprocessing
+import signal
+import time
+
+from cryptoblades import load_config
+
+
+def load_groups(service, networks):
+    config = load_config()
+    groups = config.get('supervisor', {}).get(service)
+    if groups is None:
+        return [[network] for network in networks]
+    return groups
+
+
+def stop(signum, frame):
+    raise SystemExit(0)
+
+
+def run_worker(target, networks, *args, heartbeats=None):
+    # the default SIGTERM handler exits without running finally blocks, terminate() comes as SIGTERM
+    signal.signal(signal.SIGTERM, stop)
+    target(networks, *args, heartbeats=heartbeats)
+
+
+class Worker:
+    def __init__(self, networks):
+        self.networks = networks
+        self.name = '+'.join(networks)
+        self.heartbeats = {network: multiprocessing.Value('d', 0.0) for network in networks}
+        self.process = None
+        self.started = 0
+        self.restarts = 0
+        self.next_start = 0
+
+    def last_beat(self):
+        return min(heartbeat.value for heartbeat in self.heartbeats.values())
+
+
+class Supervisor:
+    def __init__(self, service, target, groups, args=(), stale=600, interval=10, backoff_base=5, backoff_max=300):
+        self.service = service
+        self.target = target
+        self.args = args
+        self.stale = stale
+        self.interval = interval
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.workers = [Worker(networks) for networks in groups]
+
+    def start(self, worker):
+        for heartbeat in worker.heartbeats.values():
+            heartbeat.value = 0.0
+        worker.process = multiprocessing.Process(target=run_worker, name=f'{self.service}-{worker.name}',
+                                                 args=(self.target, worker.networks, *self.args),
+                                                 kwargs={'heartbeats': worker.heartbeats}, daemon=True)
+        worker.process.start()
+        worker.started = time.time()
+        print(f'{self.service} supervisor started {worker.name} pid {worker.process.pid}')
+
+    def failed(self, worker, reason):
+        # a worker that ran for a while starts over with a short delay
+        if time.time() - worker.started > self.backoff_max:
+            worker.restarts = 0
+        delay = min(self.backoff_base * 2 ** worker.restarts, self.backoff_max)
+        worker.restarts += 1
+        worker.next_start = time.time() + delay
+        worker.process = None
+        print(f'{self.service} supervisor {worker.name} {reason}, restart {worker.restarts} in {delay}s')
+
+    def check(self, worker):
+        now = time.time()
+        if worker.process is None:
+            if now < worker.next_start:
+                return 'waiting'
+            self.start(worker)
+            return 'ok'
+        if not worker.process.is_alive():
+            self.failed(worker, f'exited with code {worker.process.exitcode}')
+            return 'dead'
+        last_beat = worker.last_beat() or worker.started
+        if now - last_beat > self.stale:
+            worker.process.terminate()
+            worker.process.join(5)
+            if worker.process.is_alive():
+                worker.process.kill()
+            self.failed(worker, f'stale for {now - last_beat:.0f}s')
+            return 'stale'
+        return 'ok'
+
+    def run(self):
+        summary = None
+        while True:
+            health = {worker.name: self.check(worker) for worker in self.workers}
+            healthy = sum(1 for status in health.values() if status == 'ok')
+            unhealthy = ' '.join(f'{name}={status}' for name, status in health.items() if status != 'ok')
+            if (healthy, unhealthy) != summary:
+                summary = (healthy, unhealthy)
+                print(f'{self.service} supervisor {healthy}/{len(health)} workers ok {unhealthy}'.rstrip())
+            time.sleep(self.interval)
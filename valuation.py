@@ -0,0 +1,71 @@
+import json
+import sys
+from functools import lru_cache
+
+import numpy as np
+from pymongo import UpdateOne
+
+# stat pattern is a base 5 number, one digit per stat trait
+STAT_TRAITS = np.array([[pattern % 5, pattern // 5 % 5, pattern // 25 % 5] for pattern in range(256)], dtype=np.uint8)
+STAT_TRAITS_LIST = STAT_TRAITS.tolist()
+
+
+@lru_cache(maxsize=None)
+def load_exp_prefix(path='exp_table.json'):
+    # exp_prefix[level] is the exp needed to reach level from zero
+    with open(path) as f:
+        exp_table = json.load(f)
+    return np.concatenate(([0], np.cumsum(exp_table, dtype=np.int64)))
+
+
+def total_exp(level, exp, unclaimed_exp):
+    total = load_exp_prefix()[level] + exp + unclaimed_exp
+    return np.where(total == 0, 1, total)
+
+
+def character_value(price, level, exp, unclaimed_exp):
+    return np.asarray(price, dtype=np.float64) / total_exp(level, exp, unclaimed_exp)
+
+
+def weapon_value(price, power):
+    return np.asarray(price, dtype=np.float64) / np.asarray(power, dtype=np.float64)
+
+
+def fight_weapon_value(price, fight_power):
+    return np.asarray(price, dtype=np.float64) / np.asarray(fight_power, dtype=np.float64)
+
+
+def stat_traits(pattern):
+    return STAT_TRAITS[np.asarray(pattern, dtype=np.uint8)]
+
+
+def rescore(collection, kind, chunk=10000):
+    # recomputes the stored values of a listed or sold collection in place
+    fields = ['id', 'price', 'level', 'exp', 'u_exp'] if kind == 'character' else ['id', 'price', 'power', 'f_power']
+    cursor = collection.find({}, {field: 1 for field in fields})
+    updated = 0
+    while True:
+        documents = [document for _, document in zip(range(chunk), cursor)]
+        if not documents:
+            return updated
+        columns = {field: np.array([document.get(field, 0) for document in documents]) for field in fields}
+        if kind == 'character':
+            values = {'value': character_value(columns['price'], columns['level'], columns['exp'], columns['u_exp'])}
+        else:
+            values = {'value': weapon_value(columns['price'], columns['power']),
+                      'f_value': fight_weapon_value(columns['price'], columns['f_power'])}
+        operations = [UpdateOne({'_id': document['_id']},
+                                {'$set': {name: float(column[i]) for name, column in values.items()}})
+                      for i, document in enumerate(documents)]
+        collection.bulk_write(operations, ordered=False)
+        updated += len(operations)
+
+
+if __name__ == '__main__':
+    # python valuation.py network, after a change of the value formulas
+    from db import DB
+    db = DB().client.cryptoblades
+    for status in ['listed', 'sold']:
+        for kind in ['character', 'weapon', 'shield']:
+            name = f'cb_{sys.argv[1]}_{status}_{kind}s'
+            print(f'{name} {rescore(db[name], kind)} rescored')
@@ -0,0 +1,49 @@
+import gzip
+import time
+
+import requests
+from prometheus_client.utils import floatToGoString
+
+
+def escape(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+class VictoriaMetrics:
+    def __init__(self, url, job, instance, max_samples=50000, max_age=10):
+        self.url = f'{url}?extra_label=job={job}&extra_label=instance={instance}'
+        self.max_samples = max_samples
+        self.max_age = max_age
+        self.session = requests.Session()
+        self.session.headers.update({'Content-Type': 'text/plain', 'Content-Encoding': 'gzip'})
+        self.buffer = []
+        self.buffer_time = None
+
+    def add(self, registry, timestamp, names=None):
+        # names limits the push to those samples
+        timestamp = timestamp * 1000
+        for metric in registry.collect():
+            for sample in metric.samples:
+                if names is not None and sample.name not in names:
+                    continue
+                if sample.labels:
+                    labels = ','.join(f'{name}="{escape(value)}"' for name, value in sample.labels.items())
+                    self.buffer.append(f'{sample.name}{{{labels}}} {floatToGoString(sample.value)} {timestamp}\n')
+                else:
+                    self.buffer.append(f'{sample.name} {floatToGoString(sample.value)} {timestamp}\n')
+        if self.buffer_time is None:
+            self.buffer_time = time.monotonic()
+        if len(self.buffer) >= self.max_samples or time.monotonic() - self.buffer_time >= self.max_age:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        data = gzip.compress(''.join(self.buffer).encode())
+        try:
+            response = self.session.post(self.url, data=data, timeout=30)
+            response.raise_for_status()
+        finally:
+            # unflushed samples are regenerated from the last checkpoint
+            self.buffer = []
+            self.buffer_time = None
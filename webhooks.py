@@ -0,0 +1,106 @@
+import queue
+import threading
+import time
+
+import requests
+
+# discord message content limit
+MAX_CONTENT = 2000
+
+
+class Webhook:
+    def __init__(self, url, max_queue=500):
+        self.url = url
+        self.session = requests.Session()
+        self.queue = queue.Queue(maxsize=max_queue)
+        # message that did not fit into the previous pack
+        self.pending = None
+        self.dropped = 0
+        self.lock = threading.Lock()
+        # monotonic time before which the bucket is exhausted
+        self.blocked_until = 0
+        self.thread = threading.Thread(target=self.worker, daemon=True)
+        self.thread.start()
+
+    def put(self, content):
+        try:
+            self.queue.put_nowait(content)
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+
+    def pack(self):
+        # waits for the first message, then takes whatever else fits in one
+        if self.pending is None:
+            self.pending = self.queue.get()
+        lines = [self.pending[:MAX_CONTENT]]
+        self.pending = None
+        size = len(lines[0])
+        while True:
+            try:
+                content = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if size + 1 + len(content) > MAX_CONTENT:
+                self.pending = content
+                break
+            lines.append(content)
+            size += 1 + len(content)
+        with self.lock:
+            dropped, self.dropped = self.dropped, 0
+        if dropped:
+            summary = f'... {dropped} more dropped'
+            if size + 1 + len(summary) <= MAX_CONTENT:
+                lines.append(summary)
+            else:
+                with self.lock:
+                    self.dropped += dropped
+        return '\n'.join(lines)
+
+    def worker(self):
+        while True:
+            content = self.pack()
+            while not self.post(content):
+                pass
+
+    def post(self, content):
+        delay = self.blocked_until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        try:
+            response = self.session.post(self.url, json={'content': content}, timeout=30)
+        except requests.exceptions.RequestException as err:
+            print(f'{err}')
+            time.sleep(2)
+            return False
+        if response.status_code == 429:
+            try:
+                retry_after = float(response.json().get('retry_after', 1))
+            except ValueError:
+                retry_after = float(response.headers.get('Retry-After', 1))
+            self.blocked_until = time.monotonic() + retry_after
+            return False
+        if response.headers.get('X-RateLimit-Remaining') == '0':
+            self.blocked_until = time.monotonic() + float(response.headers.get('X-RateLimit-Reset-After', 1))
+        if response.status_code >= 500:
+            print(f'webhook {response.status_code}')
+            time.sleep(2)
+            return False
+        if response.status_code >= 400:
+            # a bad request won't get better on retry
+            print(f'webhook {response.status_code} {response.text}')
+        return True
+
+
+class Dispatcher:
+    def __init__(self, max_queue=500):
+        self.max_queue = max_queue
+        self.webhooks = {}
+        self.lock = threading.Lock()
+
+    def send(self, url, content):
+        with self.lock:
+            webhook = self.webhooks.get(url)
+            if webhook is None:
+                webhook = self.webhooks[url] = Webhook(url, self.max_queue)
+        webhook.put(content)